@@ -0,0 +1,214 @@
+"""Fan-out of chat frames between workers (uvicorn processes or nodes)."""
+import asyncio
+import inspect
+import os
+import socket
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+from app.core.audit_log import define_logger
+from app.core.config import config
+from app.core.db import async_database
+
+# deliver(project_id, payload): hands an encoded frame to this worker's sockets
+Deliver = Callable[[str, str], None]
+
+
+class ChatBroker:
+    """
+    Carries encoded frames to every worker with members in the project.
+    ``subscribe``/``unsubscribe`` are called as a project gains its first /
+    loses its last local member, so a backend only receives projects it can
+    deliver.
+    """
+
+    # True when frames published by other workers arrive through the broker
+    remote = False
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+        self._on_remote: Optional[Deliver] = None
+        self.projects = set()
+        self._counters = {"published": 0, "delivered_local": 0, "received_remote": 0, "publish_errors": 0}
+
+    def bind(self, deliver: Deliver, on_remote: Deliver = None):
+        """``on_remote`` additionally sees frames published by other workers."""
+        self._deliver = deliver
+        self._on_remote = on_remote
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def subscribe(self, project_id: str):
+        self.projects.add(project_id)
+
+    def unsubscribe(self, project_id: str):
+        self.projects.discard(project_id)
+
+    async def publish(self, project_id: str, payload: str):
+        raise NotImplementedError
+
+    def _deliver_local(self, project_id: str, payload: str):
+        if project_id in self.projects:
+            self._counters["delivered_local"] += 1
+            self._deliver(project_id, payload)
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__, **self._counters, "projects": len(self.projects)}
+
+
+class InProcessBroker(ChatBroker):
+    """Single worker: publishing is local delivery."""
+
+    async def publish(self, project_id: str, payload: str):
+        self._counters["published"] += 1
+        self._deliver_local(project_id, payload)
+
+
+class MongoCappedBroker(ChatBroker):
+    """
+    Workers append frames to a capped collection and tail it with a
+    tailable-await cursor filtered to their own subscribed projects,
+    skipping frames they published (those are delivered locally at once).
+    The cursor is reopened when the subscription set changes or dies. It
+    resumes from the last frame seen rather than the local clock, reaching
+    back ``overlap`` seconds because ids from different writers created in
+    the same second do not sort in insertion order; recently seen ids are
+    remembered to drop the re-reads. Needs nothing beyond the MongoDB the
+    services already use.
+    """
+
+    remote = True
+
+    def __init__(self, database, name: str, size_bytes: int, max_await_ms: int = 500,
+                 overlap: float = 2.0, remember: int = 10000):
+        super().__init__()
+        self.collection = database[name]
+        self.database = database
+        self.name = name
+        self.size_bytes = size_bytes
+        self.max_await_ms = max_await_ms
+        self.overlap = overlap
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._recent = OrderedDict()  # _id -> None, oldest first
+        self._remember = remember
+        self._last_id: Optional[ObjectId] = None  # highest frame id seen
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._counters.update({"duplicates_skipped": 0, "cursor_restarts": 0})
+
+    async def start(self):
+        try:
+            await self.database.create_collection(self.name, capped=True, size=self.size_bytes)
+        except CollectionInvalid:
+            pass  # created by another worker
+        # Earlier frames predate this worker's members (joiners get the history replay)
+        self._last_id = ObjectId.from_datetime(datetime.now(timezone.utc))
+        self._task = asyncio.create_task(self._tail())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def subscribe(self, project_id: str):
+        if project_id not in self.projects:
+            super().subscribe(project_id)
+            self._changed.set()
+
+    def unsubscribe(self, project_id: str):
+        if project_id in self.projects:
+            super().unsubscribe(project_id)
+            self._changed.set()
+
+    async def publish(self, project_id: str, payload: str):
+        self._counters["published"] += 1
+        self._deliver_local(project_id, payload)
+        try:
+            await self.collection.insert_one({"project_id": project_id, "origin": self.origin, "payload": payload})
+        except PyMongoError as exc:
+            # Local members already have it; other workers miss this frame
+            self._counters["publish_errors"] += 1
+            define_logger(
+                level=40,
+                message=f"Chat broker publish failed for project {project_id}: {exc}",
+                pid=os.getpid(),
+                loggName=inspect.stack()[0],
+            )
+
+    def _seen(self, doc_id: ObjectId) -> bool:
+        if doc_id in self._recent:
+            return True
+        self._recent[doc_id] = None
+        if len(self._recent) > self._remember:
+            self._recent.popitem(last=False)
+        return False
+
+    def _start_from(self) -> ObjectId:
+        return ObjectId.from_datetime(self._last_id.generation_time - timedelta(seconds=self.overlap))
+
+    async def _tail(self):
+        while True:
+            self._changed.clear()
+            if not self.projects:
+                await self._changed.wait()
+                continue
+            self._counters["cursor_restarts"] += 1
+            query = {
+                "_id": {"$gte": self._start_from()},
+                "project_id": {"$in": sorted(self.projects)},
+                "origin": {"$ne": self.origin},
+            }
+            try:
+                cursor = self.collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                cursor = cursor.max_await_time_ms(self.max_await_ms)
+                while cursor.alive and not self._changed.is_set():
+                    async for doc in cursor:
+                        self._receive(doc)
+                        if self._changed.is_set():
+                            break
+                await cursor.close()
+                if not self._changed.is_set():
+                    # Dead cursor (nothing matched yet): don't spin
+                    await asyncio.sleep(self.max_await_ms / 1000)
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as exc:
+                define_logger(
+                    level=40,
+                    message=f"Chat broker tail failed, retrying: {exc}",
+                    pid=os.getpid(),
+                    loggName=inspect.stack()[0],
+                )
+                await asyncio.sleep(1)
+
+    def _receive(self, doc: dict):
+        if self._seen(doc["_id"]):
+            self._counters["duplicates_skipped"] += 1
+            return
+        self._last_id = max(self._last_id, doc["_id"])
+        self._counters["received_remote"] += 1
+        if self._on_remote is not None and doc["project_id"] in self.projects:
+            self._on_remote(doc["project_id"], doc["payload"])
+        self._deliver_local(doc["project_id"], doc["payload"])
+
+
+def chat_broker() -> ChatBroker:
+    """Broker backend per CHAT_BROKER: "memory" (one worker) or "mongo"."""
+    if config["chat_broker"] == "mongo":
+        return MongoCappedBroker(
+            async_database,
+            name=config["chat_broker_collection"],
+            size_bytes=config["chat_broker_size_mb"] * 1024 * 1024,
+            max_await_ms=config["chat_broker_max_await_ms"],
+        )
+    return InProcessBroker()
@@ -0,0 +1,123 @@
+"""Circuit breaker and retry backoff for calls to external services."""
+import inspect
+import os
+import random
+import threading
+import time
+
+from app.core.audit_log import define_logger
+from app.core.config import config
+from app.core.exceptions import ServiceUnavailable
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Classic closed / open / half-open breaker.
+
+    ``failure_threshold`` consecutive failures open the circuit; while open
+    every call fails fast with a 503. After ``recovery_timeout`` seconds up to
+    ``half_open_max_calls`` probe calls are let through: one success closes
+    the circuit again, one failure re-opens it. Safe to use from threads and
+    from the event loop (the lock is only held for bookkeeping).
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "failures": 0, "rejected": 0}
+        self._transitions = {}
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def _transition(self, new_state: str):
+        key = f"{self._state}->{new_state}"
+        self._transitions[key] = self._transitions.get(key, 0) + 1
+        define_logger(
+            level=30 if new_state == OPEN else 20,
+            message=f"Circuit '{self.name}' {key}",
+            pid=os.getpid(),
+            loggName=inspect.stack()[0],
+        )
+        self._state = new_state
+        if new_state in (OPEN, HALF_OPEN):
+            self._opened_at = time.monotonic()
+        if new_state != HALF_OPEN:
+            self._half_open_calls = 0
+
+    def retry_after(self) -> int:
+        """Seconds until the next probe is allowed."""
+        return max(int(self._opened_at + self.recovery_timeout - time.monotonic()) + 1, 1)
+
+    def before_call(self):
+        """Raise ServiceUnavailable if the call must not reach the service."""
+        with self._lock:
+            elapsed = time.monotonic() - self._opened_at
+            if self._state == OPEN and elapsed >= self.recovery_timeout:
+                self._transition(HALF_OPEN)
+            elif self._state == HALF_OPEN and elapsed >= self.recovery_timeout:
+                # Probes that never reported back (e.g. cancelled) free their slot.
+                self._half_open_calls = 0
+                self._opened_at = time.monotonic()
+            if self._state == OPEN or (
+                self._state == HALF_OPEN and self._half_open_calls >= self.half_open_max_calls
+            ):
+                self._counters["rejected"] += 1
+                raise ServiceUnavailable(
+                    detail=f"{self.name} is temporarily unavailable",
+                    retry_after=self.retry_after(),
+                )
+            if self._state == HALF_OPEN:
+                self._half_open_calls += 1
+            self._counters["calls"] += 1
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self._state != CLOSED:
+                self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._counters["failures"] += 1
+            if self._state == HALF_OPEN or (
+                self._state == CLOSED and self._failures >= self.failure_threshold
+            ):
+                self._transition(OPEN)
+
+    def stats(self) -> dict:
+        return {
+            "state": self._state,
+            "consecutive_failures": self._failures,
+            **self._counters,
+            "transitions": dict(self._transitions),
+        }
+
+
+def backoff_delay(attempt: int, base: float = None, cap: float = None) -> float:
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**attempt))."""
+    base = config["keycloak_retry_base"] if base is None else base
+    cap = config["keycloak_retry_cap"] if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+keycloak_breaker = CircuitBreaker(
+    name="Keycloak",
+    failure_threshold=config["keycloak_breaker_failures"],
+    recovery_timeout=config["keycloak_breaker_recovery"],
+    half_open_max_calls=config["keycloak_breaker_half_open_calls"],
+)
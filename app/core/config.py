@@ -30,6 +30,76 @@ if not config:
     config["user_name"] = os.environ["USER_NAME"]
     config["passcode"] = os.environ["PASSCODE"]
 
+    # "motor": async repositories; "pymongo": blocking ones run in the threadpool
+    config["db_driver"] = os.environ.get("DB_DRIVER", "motor")
+    config["db_max_pool_size"] = int(os.environ.get("DB_MAX_POOL_SIZE", "100"))
+
+    config["jwks_ttl"] = int(os.environ.get("JWKS_TTL", "300"))
+    # "remote": check every caller against Keycloak, "local": signature + cached status
+    config["auth_mode"] = os.environ.get("AUTH_MODE", "remote")
+    config["user_cache_ttl"] = int(os.environ.get("USER_CACHE_TTL", "60"))
+    config["user_cache_size"] = int(os.environ.get("USER_CACHE_SIZE", "10000"))
+
+    config["keycloak_timeout"] = float(os.environ.get("KEYCLOAK_TIMEOUT", "5"))
+    config["keycloak_max_connections"] = int(os.environ.get("KEYCLOAK_MAX_CONNECTIONS", "100"))
+    config["keycloak_max_keepalive"] = int(os.environ.get("KEYCLOAK_MAX_KEEPALIVE", "20"))
+    config["keycloak_max_retries"] = int(os.environ.get("KEYCLOAK_MAX_RETRIES", "3"))
+    config["keycloak_retry_base"] = float(os.environ.get("KEYCLOAK_RETRY_BASE", "0.2"))
+    config["keycloak_retry_cap"] = float(os.environ.get("KEYCLOAK_RETRY_CAP", "2"))
+    config["keycloak_breaker_failures"] = int(os.environ.get("KEYCLOAK_BREAKER_FAILURES", "5"))
+    config["keycloak_breaker_recovery"] = float(os.environ.get("KEYCLOAK_BREAKER_RECOVERY", "30"))
+    config["keycloak_breaker_half_open_calls"] = int(os.environ.get("KEYCLOAK_BREAKER_HALF_OPEN_CALLS", "1"))
+    config["refresh_coalesce_window"] = float(os.environ.get("REFRESH_COALESCE_WINDOW", "10"))
+    # Must cover the longest-lived token of a session (Keycloak SSO session max)
+    config["revocation_ttl"] = int(os.environ.get("REVOCATION_TTL", "36000"))
+    config["revocation_reload_interval"] = float(os.environ.get("REVOCATION_RELOAD_INTERVAL", "30"))
+
+    config["page_size_default"] = int(os.environ.get("PAGE_SIZE_DEFAULT", "50"))
+    config["page_size_max"] = int(os.environ.get("PAGE_SIZE_MAX", "200"))
+
+    config["ticket_timeline_bucket_size"] = int(os.environ.get("TICKET_TIMELINE_BUCKET_SIZE", "50"))
+
+    config["chat_history_page_size"] = int(os.environ.get("CHAT_HISTORY_PAGE_SIZE", "50"))
+    # Resuming sockets that missed more than this get the latest page instead of a replay
+    config["chat_history_replay_max"] = int(os.environ.get("CHAT_HISTORY_REPLAY_MAX", "1000"))
+    # Seconds before ``since`` a resume reaches back: ids made by different
+    # workers within one second do not sort in creation order
+    config["chat_resume_overlap"] = float(os.environ.get("CHAT_RESUME_OVERLAP", "2"))
+    config["chat_recent_per_project"] = int(os.environ.get("CHAT_RECENT_PER_PROJECT", "100"))
+    config["chat_recent_max_mb"] = int(os.environ.get("CHAT_RECENT_MAX_MB", "32"))
+    config["chat_read_flush_interval"] = float(os.environ.get("CHAT_READ_FLUSH_INTERVAL", "5"))
+    # Unread counts stop at this many (clients show e.g. "999+")
+    config["chat_unread_cap"] = int(os.environ.get("CHAT_UNREAD_CAP", "1000"))
+    config["chat_write_batch_size"] = int(os.environ.get("CHAT_WRITE_BATCH_SIZE", "500"))
+    config["chat_write_flush_interval"] = float(os.environ.get("CHAT_WRITE_FLUSH_INTERVAL", "0.05"))
+    config["chat_write_queue_size"] = int(os.environ.get("CHAT_WRITE_QUEUE_SIZE", "10000"))
+    config["chat_write_retries"] = int(os.environ.get("CHAT_WRITE_RETRIES", "3"))
+    config["ws_send_queue_size"] = int(os.environ.get("WS_SEND_QUEUE_SIZE", "256"))
+    # Frames dropped in a row (send queue full) before a slow socket is closed
+    config["ws_slow_consumer_drops"] = int(os.environ.get("WS_SLOW_CONSUMER_DROPS", "32"))
+    config["ws_heartbeat_interval"] = float(os.environ.get("WS_HEARTBEAT_INTERVAL", "25"))
+    # Sockets that sent nothing (pongs included) for this long are closed
+    config["ws_idle_timeout"] = float(os.environ.get("WS_IDLE_TIMEOUT", "75"))
+    # Checked per frame by the chat service; the Dockerfile also passes it to
+    # uvicorn as --ws-max-size so larger frames are refused before buffering.
+    # Keep the two in step when running uvicorn some other way.
+    config["ws_max_frame_bytes"] = int(os.environ.get("WS_MAX_FRAME_BYTES", "16384"))
+    config["ws_rate_per_sec"] = float(os.environ.get("WS_RATE_PER_SEC", "5"))
+    config["ws_rate_burst"] = float(os.environ.get("WS_RATE_BURST", "20"))
+    config["ws_max_sockets_per_user"] = int(os.environ.get("WS_MAX_SOCKETS_PER_USER", "10"))
+    # "memory" for a single worker; "mongo" fans out across workers through a capped collection
+    config["chat_broker"] = os.environ.get("CHAT_BROKER", "memory")
+    config["chat_broker_collection"] = os.environ.get("CHAT_BROKER_COLLECTION", "chat_fanout")
+    config["chat_broker_size_mb"] = int(os.environ.get("CHAT_BROKER_SIZE_MB", "16"))
+    config["chat_broker_max_await_ms"] = int(os.environ.get("CHAT_BROKER_MAX_AWAIT_MS", "500"))
+
+    config["bulk_import_chunk_size"] = int(os.environ.get("BULK_IMPORT_CHUNK_SIZE", "100"))
+    # A partial import hashes every password in the chunk; allow much longer than KEYCLOAK_TIMEOUT
+    config["bulk_import_timeout"] = float(os.environ.get("BULK_IMPORT_TIMEOUT", "60"))
+    config["signup_reservation_timeout"] = int(os.environ.get("SIGNUP_RESERVATION_TIMEOUT", "300"))
+    config["signup_reconcile_interval"] = float(os.environ.get("SIGNUP_RECONCILE_INTERVAL", "60"))
+    config["signup_reconcile_batch"] = int(os.environ.get("SIGNUP_RECONCILE_BATCH", "100"))
+
     config = dotdict(config)
 
 print(config)
@@ -1,6 +1,9 @@
 # app/db.py
+import inspect
+from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure
+from starlette.concurrency import run_in_threadpool
 from app.core.config import config
 
 DATABASE_URL = f"mongodb://{config['db_user']}:{config['db_password']}@{config['db_url']}"
@@ -10,6 +13,36 @@ print(f"Connecting to MongoDB at {DATABASE_URL}...")  # Debugging line
 client = MongoClient(DATABASE_URL)
 database = client[DATABASE_NAME]
 
+# Non-blocking client used by the async repositories. Motor binds to the
+# running event loop on first use, so creating it at import time is safe.
+async_client = AsyncIOMotorClient(DATABASE_URL, maxPoolSize=config["db_max_pool_size"])
+async_database = async_client[DATABASE_NAME]
+
+
+def use_motor() -> bool:
+    return config["db_driver"] != "pymongo"
+
+
+class ThreadpoolRepository:
+    """
+    Async facade over a blocking repository: every method call is awaited
+    in Starlette's threadpool. Lets services await one interface whichever
+    driver ``DB_DRIVER`` selects while the motor repositories roll out.
+    """
+
+    def __init__(self, repo):
+        self._repo = repo
+
+    def __getattr__(self, name):
+        attr = getattr(self._repo, name)
+        if not inspect.ismethod(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await run_in_threadpool(attr, *args, **kwargs)
+
+        return call
+
 
 def check_db_connection() -> bool:
     """Ping MongoDB to check if the connection is alive."""
@@ -12,3 +12,8 @@ class Unauthorized(HTTPException):
 class BadRequest(HTTPException):
     def __init__(self, detail: str = "Bad Request"):
         super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+class ServiceUnavailable(HTTPException):
+    def __init__(self, detail: str = "Service Unavailable", retry_after: int = None):
+        headers = {"Retry-After": str(retry_after)} if retry_after else None
+        super().__init__(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail, headers=headers)
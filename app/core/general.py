@@ -226,7 +226,7 @@ def create_unique_index(
     try:
         collection: Collection = database[collection_name]
         index_info = collection.index_information()
-        if field not in index_info:
+        if f"{field}_1" not in index_info:
             return collection.create_index([(field, 1)], unique=True)
         return None
     except PyMongoError as exc:
@@ -247,17 +247,15 @@ def create_compond_index(
     user: dict = None,
     request=None,
 ):
-    """Create a Unique index for the given field if it's not already created"""
+    """Create a unique compound index over the given fields if it's not already created"""
     loggername = inspect.stack()[0]
     pid = os.getpid()
     try:
         collection: Collection = database[collection_name]
         index_info = collection.index_information()
-        if field not in index_info:
-            collection.create_index(
-                [("name", 1), ("type", 1), ("parent", 1), ("store_id", 1)],
-                unique=True,
-            )
+        keys = [(name, 1) for name in field]
+        if "_".join(f"{name}_1" for name in field) not in index_info:
+            collection.create_index(keys, unique=True)
         return None
     except PyMongoError as exc:
         error_response = error_response_model(code=500, error_code=3000)
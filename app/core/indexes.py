@@ -0,0 +1,233 @@
+"""Declarative MongoDB index specs, applied at startup and checked for drift."""
+import inspect
+import os
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING
+from pymongo.database import Database
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.core.audit_log import define_logger
+from app.core.db import database
+
+# Emails are unique regardless of case
+EMAIL_COLLATION = {"locale": "en", "strength": 2}
+
+
+class IndexSpec:
+    """One index as we want it to exist; options mirror ``create_index``."""
+
+    def __init__(
+        self,
+        keys: List[tuple],
+        name: str,
+        unique: bool = False,
+        collation: Optional[dict] = None,
+        expire_after_seconds: Optional[int] = None,
+        partial_filter: Optional[dict] = None,
+    ):
+        self.keys = [(field, direction) for field, direction in keys]
+        self.name = name
+        self.unique = unique
+        self.collation = collation
+        self.expire_after_seconds = expire_after_seconds
+        self.partial_filter = partial_filter
+
+    def create_kwargs(self) -> dict:
+        kwargs = {"name": self.name, "unique": self.unique}
+        if self.collation:
+            kwargs["collation"] = self.collation
+        if self.expire_after_seconds is not None:
+            kwargs["expireAfterSeconds"] = self.expire_after_seconds
+        if self.partial_filter:
+            kwargs["partialFilterExpression"] = self.partial_filter
+        return kwargs
+
+    def differences(self, info: dict) -> List[str]:
+        """Options of an existing index (from index_information) that differ from the spec."""
+        diffs = []
+        if [(field, direction) for field, direction in info["key"]] != self.keys:
+            diffs.append(f"keys {info['key']} != {self.keys}")
+        if bool(info.get("unique")) != self.unique:
+            diffs.append(f"unique {bool(info.get('unique'))} != {self.unique}")
+        if info.get("expireAfterSeconds") != self.expire_after_seconds:
+            diffs.append(f"expireAfterSeconds {info.get('expireAfterSeconds')} != {self.expire_after_seconds}")
+        if (info.get("partialFilterExpression") or None) != self.partial_filter:
+            diffs.append(f"partialFilterExpression {info.get('partialFilterExpression')} != {self.partial_filter}")
+        existing_collation = info.get("collation") or {}
+        for option, value in (self.collation or {}).items():
+            if existing_collation.get(option) != value:
+                diffs.append(f"collation.{option} {existing_collation.get(option)} != {value}")
+        if existing_collation and not self.collation:
+            diffs.append("unexpected collation")
+        return diffs
+
+
+# Every index the services rely on, per collection. Add new query shapes here.
+INDEX_SPECS: Dict[str, List[IndexSpec]] = {
+    "user": [
+        # get_user_by_id on every authenticated request
+        IndexSpec([("user_id", ASCENDING)], "user_id_unique", unique=True),
+        IndexSpec([("username", ASCENDING)], "username_unique", unique=True),
+        IndexSpec([("email", ASCENDING)], "email_unique", unique=True, collation=EMAIL_COLLATION),
+        # freelancer listing, paged on _id
+        IndexSpec([("role", ASCENDING), ("status", ASCENDING), ("_id", ASCENDING)], "role_status_page"),
+        # signup reconciler; only PENDING reservations carry reserved_at
+        IndexSpec(
+            [("reserved_at", ASCENDING)],
+            "pending_reserved_at",
+            partial_filter={"status": "PENDING"},
+        ),
+    ],
+    "chat_messages": [
+        # socket history replay and REST paging, both on _id
+        IndexSpec([("project_id", ASCENDING), ("_id", ASCENDING)], "project_page"),
+    ],
+    "chat_read_watermarks": [
+        # one watermark per reader; also serves a project's receipts
+        IndexSpec([("project_id", ASCENDING), ("user_id", ASCENDING)], "project_user_unique", unique=True),
+    ],
+    "chat_requests": [
+        IndexSpec([("request_id", ASCENDING)], "request_id_unique", unique=True),
+        # request_exists
+        IndexSpec(
+            [("client_id", ASCENDING), ("freelancer_id", ASCENDING), ("status", ASCENDING)],
+            "client_freelancer_status",
+        ),
+        # sent / received requests, paged on _id
+        IndexSpec([("client_id", ASCENDING), ("_id", ASCENDING)], "client_page"),
+        IndexSpec([("freelancer_id", ASCENDING), ("_id", ASCENDING)], "freelancer_page"),
+        # project_exists, one per role
+        IndexSpec(
+            [("project_id", ASCENDING), ("freelancer_id", ASCENDING), ("status", ASCENDING)],
+            "project_freelancer_status",
+        ),
+        IndexSpec(
+            [("project_id", ASCENDING), ("client_id", ASCENDING), ("status", ASCENDING)],
+            "project_client_status",
+        ),
+    ],
+    "tickets": [
+        IndexSpec([("ticket_id", ASCENDING)], "ticket_id_unique", unique=True),
+        # freelancer's tickets, paged on _id
+        IndexSpec([("freelancer_id", ASCENDING), ("_id", ASCENDING)], "freelancer_page"),
+    ],
+    "ticket_timelines": [
+        IndexSpec([("ticket_id", ASCENDING), ("seq", ASCENDING)], "ticket_seq_unique", unique=True),
+    ],
+    "revoked_sessions": [
+        IndexSpec([("kind", ASCENDING), ("key", ASCENDING)], "kind_key_unique", unique=True),
+        IndexSpec([("expires_at", ASCENDING)], "expires_at_ttl", expire_after_seconds=0),
+    ],
+}
+
+
+class IndexManager:
+    """
+    Applies ``INDEX_SPECS`` idempotently: missing indexes are created,
+    matching ones left alone, and indexes whose options drifted from the
+    spec are reported rather than dropped (rebuilding a large index is an
+    operator decision). ``report()`` adds unmanaged and unused indexes.
+    """
+
+    def __init__(self, db: Database, specs: Dict[str, List[IndexSpec]]):
+        self.db = db
+        self.specs = specs
+        self._last_run = {"created": [], "drifted": [], "failed": []}
+
+    @staticmethod
+    def _find_existing(spec: IndexSpec, existing: dict) -> Optional[tuple]:
+        """Match by name first, then by key pattern (same keys under another name)."""
+        if spec.name in existing:
+            return spec.name, existing[spec.name]
+        for name, info in existing.items():
+            if [(field, direction) for field, direction in info["key"]] == spec.keys:
+                return name, info
+        return None
+
+    def ensure(self) -> dict:
+        created, drifted, failed = [], [], []
+        for collection_name, specs in self.specs.items():
+            collection = self.db[collection_name]
+            try:
+                existing = collection.index_information()
+            except PyMongoError as exc:
+                failed.append({"collection": collection_name, "error": str(exc)})
+                continue
+            for spec in specs:
+                match = self._find_existing(spec, existing)
+                if match is not None:
+                    name, info = match
+                    diffs = spec.differences(info)
+                    if diffs:
+                        drifted.append({"collection": collection_name, "index": name, "differences": diffs})
+                    continue
+                try:
+                    collection.create_index(spec.keys, **spec.create_kwargs())
+                    created.append(f"{collection_name}.{spec.name}")
+                except PyMongoError as exc:
+                    # e.g. duplicates already stored under a new unique index
+                    failed.append({"collection": collection_name, "index": spec.name, "error": str(exc)})
+
+        for entry in drifted:
+            define_logger(
+                level=30,
+                message=f"Index drift on {entry['collection']}.{entry['index']}: {'; '.join(entry['differences'])}",
+                pid=os.getpid(),
+                loggName=inspect.stack()[0],
+            )
+        for entry in failed:
+            define_logger(
+                level=40,
+                message=f"Index creation failed on {entry['collection']}.{entry.get('index', '*')}: {entry['error']}",
+                pid=os.getpid(),
+                loggName=inspect.stack()[0],
+            )
+        self._last_run = {"created": created, "drifted": drifted, "failed": failed}
+        return self._last_run
+
+    def _usage(self, collection_name: str) -> dict:
+        """Access counts per index name from $indexStats (since the last mongod restart)."""
+        try:
+            stats = self.db[collection_name].aggregate([{"$indexStats": {}}])
+            return {entry["name"]: entry.get("accesses", {}) for entry in stats}
+        except OperationFailure:
+            # $indexStats needs the clusterMonitor role (or equivalent)
+            return {}
+
+    def report(self) -> dict:
+        """Missing, drifted, unmanaged and unused indexes for the managed collections."""
+        missing, drifted, unmanaged, unused = [], [], [], []
+        for collection_name, specs in self.specs.items():
+            existing = self.db[collection_name].index_information()
+            managed = set()
+            for spec in specs:
+                match = self._find_existing(spec, existing)
+                if match is None:
+                    missing.append(f"{collection_name}.{spec.name}")
+                    continue
+                name, info = match
+                managed.add(name)
+                diffs = spec.differences(info)
+                if diffs:
+                    drifted.append({"collection": collection_name, "index": name, "differences": diffs})
+            unmanaged.extend(
+                f"{collection_name}.{name}" for name in existing if name != "_id_" and name not in managed
+            )
+            for name, accesses in self._usage(collection_name).items():
+                if name != "_id_" and not accesses.get("ops"):
+                    since = accesses.get("since")
+                    unused.append({
+                        "index": f"{collection_name}.{name}",
+                        "since": since.isoformat() if since else None,
+                    })
+        return {
+            "missing": missing,
+            "drifted": drifted,
+            "unmanaged": unmanaged,
+            "unused": unused,
+            "last_run": self._last_run,
+        }
+
+
+index_manager = IndexManager(database, INDEX_SPECS)
@@ -0,0 +1,127 @@
+"""Process-wide JWKS cache used to verify Keycloak access tokens locally."""
+import inspect
+import os
+import threading
+import time
+
+import jwt
+import requests
+from jwt.exceptions import InvalidTokenError
+from starlette.concurrency import run_in_threadpool
+
+from app.core.audit_log import define_logger
+from app.core.config import config
+
+
+class JWKSVerifier:
+    """
+    Fetches the realm JWKS once, keeps parsed public keys indexed by ``kid``
+    and verifies RS256 tokens against them.
+
+    The key set is refreshed when its TTL runs out or when a token carries a
+    ``kid`` we have not seen yet (key rotation). Refreshes are single-flight:
+    concurrent callers wait for the one fetch in progress instead of issuing
+    their own.
+    """
+
+    def __init__(self, jwks_url: str, ttl: int = 300, min_refresh_interval: int = 10, timeout: int = 5):
+        self.jwks_url = jwks_url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+
+        self._keys = {}
+        self._expires_at = 0.0
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "refreshes": 0, "refresh_failures": 0}
+
+    def _fetch(self) -> dict:
+        """Download the JWKS document and parse every signing key in it."""
+        response = requests.get(self.jwks_url, timeout=self.timeout)
+        response.raise_for_status()
+        keys = {}
+        for jwk in response.json().get("keys", []):
+            if jwk.get("use", "sig") != "sig" or "kid" not in jwk:
+                continue
+            try:
+                keys[jwk["kid"]] = jwt.PyJWK(jwk).key
+            except jwt.exceptions.PyJWKError:
+                continue
+        return keys
+
+    def _refresh(self, seen_generation: float, force: bool = False):
+        """Refresh the key set unless another thread already did it."""
+        with self._lock:
+            if self._last_refresh != seen_generation:
+                # Somebody refreshed while we were waiting for the lock.
+                return
+            now = time.monotonic()
+            if force and now - self._last_refresh < self.min_refresh_interval:
+                # Unknown kids must not be able to hammer Keycloak.
+                return
+            try:
+                keys = self._fetch()
+            except (requests.exceptions.RequestException, ValueError) as exc:
+                self._counters["refresh_failures"] += 1
+                define_logger(
+                    level=40,
+                    message=f"Failed to refresh JWKS: {exc}",
+                    pid=os.getpid(),
+                    loggName=inspect.stack()[0],
+                )
+                if not self._keys:
+                    raise
+                # Keep serving the stale key set, retry after the short interval.
+                self._last_refresh = now
+                self._expires_at = now + self.min_refresh_interval
+                return
+            self._keys = keys
+            self._last_refresh = now
+            self._expires_at = now + self.ttl
+            self._counters["refreshes"] += 1
+
+    def get_key(self, kid: str):
+        """Return the public key for ``kid``, refreshing the key set if needed."""
+        generation = self._last_refresh
+        if time.monotonic() >= self._expires_at:
+            self._refresh(generation)
+            generation = self._last_refresh
+
+        key = self._keys.get(kid)
+        if key is not None:
+            self._counters["hits"] += 1
+            return key
+
+        self._counters["misses"] += 1
+        self._refresh(generation, force=True)
+        key = self._keys.get(kid)
+        if key is None:
+            raise InvalidTokenError(f"Unknown signing key: {kid}")
+        return key
+
+    def decode(self, token: str, audience: str = "account") -> dict:
+        """Verify the token signature and claims and return its payload."""
+        header = jwt.get_unverified_header(token)
+        key = self.get_key(header.get("kid"))
+        return jwt.decode(token, key, algorithms=["RS256"], audience=audience)
+
+    async def decode_async(self, token: str, audience: str = "account") -> dict:
+        """``decode`` for the event loop: a key-set refresh (a blocking fetch) runs in the threadpool."""
+        header = jwt.get_unverified_header(token)
+        kid = header.get("kid")
+        if time.monotonic() >= self._expires_at or kid not in self._keys:
+            key = await run_in_threadpool(self.get_key, kid)
+        else:
+            key = self.get_key(kid)
+        return jwt.decode(token, key, algorithms=["RS256"], audience=audience)
+
+    def stats(self) -> dict:
+        """Counters for hits, misses and refreshes plus the number of cached keys."""
+        return {**self._counters, "keys": len(self._keys)}
+
+
+jwks_verifier = JWKSVerifier(
+    jwks_url=f"{config['keyclock_url']}/realms/{config['realm_name']}/protocol/openid-connect/certs",
+    ttl=config["jwks_ttl"],
+)
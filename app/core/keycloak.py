@@ -2,14 +2,15 @@ import requests, os, json, inspect
 from dataclasses import asdict
 from app.core.config import config
 from keycloak import KeycloakOpenID, KeycloakAdmin
-from base64 import b64decode
 from jwt.exceptions import DecodeError, InvalidTokenError
 from app.core.audit_log import define_logger
+from app.core.circuit_breaker import backoff_delay, keycloak_breaker
+from app.core.exceptions import ServiceUnavailable
+from app.core.jwks import jwks_verifier
+from app.core.revocation import revocation_list
+from app.core.token_manager import ClientTokenManager
 from app.repositories.user import UserRepository
 
-from cryptography.hazmat.primitives import serialization
-import jwt
-
 import time
 
 from fastapi import HTTPException, Depends
@@ -21,8 +22,10 @@ REALM_NAME = config["realm_name"]
 CLIENT_ID = config["client_id"]
 CLIENT_SECRET = config["client_secret"]
 
-MAX_RETRIES = 5
-RETRY_INTERVAL = 3  # seconds
+MAX_RETRIES = config["keycloak_max_retries"]
+
+# Pooled HTTP session for the blocking Keycloak calls
+http_session = requests.Session()
 
 # Initialize Keycloak OpenID Client
 keycloak_openid = KeycloakOpenID(
@@ -35,6 +38,38 @@ keycloak_openid = KeycloakOpenID(
 # OAuth2 scheme for token retrieval
 oauth2_scheme = APIKeyHeader(name="Authorization")
 
+def resolve_local_principal(user_base_detail: dict) -> dict:
+    """Resolve the caller from a verified token without asking Keycloak."""
+    user_id = user_base_detail.get("preferred_username")
+    if not user_id:
+        raise HTTPException(status_code=400, detail="Invalid token structure")
+    # Served from the request memo / user cache; Mongo only on a miss
+    user = UserRepository().get_user_by_id(user_id=user_id)
+    if user.get("status") != "ACTIVE":
+        raise HTTPException(status_code=401, detail="User is disabled")
+    return user
+
+
+def keycloak_request(method: str, url: str, timeout: float = None, **kwargs) -> requests.Response:
+    """
+    Send a request to Keycloak through the circuit breaker. Connection errors,
+    timeouts and 5xx answers count as failures; while the circuit is open this
+    raises a 503 without touching the network.
+    """
+    keycloak_breaker.before_call()
+    try:
+        response = http_session.request(
+            method, url, timeout=timeout or config["keycloak_timeout"], **kwargs
+        )
+    except requests.exceptions.RequestException:
+        keycloak_breaker.record_failure()
+        raise
+    if response.status_code >= 500:
+        keycloak_breaker.record_failure()
+    else:
+        keycloak_breaker.record_success()
+    return response
+
 
 def keycloak_instance():
     """Initialize KeycloakAdmin instance"""
@@ -49,8 +84,8 @@ def keycloak_instance():
 
 
 
-def get_client_access_token():
-    """Get an access token using client credentials, with retry logic."""
+def request_client_token() -> dict:
+    """Request a new client credentials token from Keycloak, with retry logic."""
     url = f"{KEYCLOAK_URL}/realms/{REALM_NAME}/protocol/openid-connect/token"
     data = {
         "grant_type": "client_credentials",
@@ -61,14 +96,14 @@ def get_client_access_token():
     for attempt in range(1, MAX_RETRIES + 1):
         try:
             print(f"🔁 Attempt {attempt}: Connecting to Keycloak at {url}")
-            response = requests.post(url, data=data, timeout=5)
+            response = keycloak_request("POST", url, data=data)
             response.raise_for_status()
             token = response.json()
             access_token = token.get("access_token")
 
             if access_token:
                 print("✅ Successfully retrieved Keycloak access token.")
-                return access_token
+                return token
             else:
                 define_logger(
                     level=40,
@@ -89,11 +124,48 @@ def get_client_access_token():
                     pid=os.getpid(),
                     loggName=inspect.stack()[0],
                 )
-                raise HTTPException(
-                    status_code=500,
+                raise ServiceUnavailable(
                     detail="Keycloak not reachable after multiple attempts",
                 )
-            time.sleep(RETRY_INTERVAL)
+            time.sleep(backoff_delay(attempt))
+
+
+# Admin token shared by every admin call in this process
+client_token_manager = ClientTokenManager(fetch=request_client_token)
+
+
+def get_client_access_token():
+    """Get a cached access token using client credentials."""
+    return client_token_manager.get_token()
+
+
+def admin_token(token=None):
+    """Use the caller's token if given, otherwise the shared admin token."""
+    return token or client_token_manager.get_token()
+
+
+def get_user_in_keycloak(keycloak_user_id, token=None):
+    """Fetch a user representation from Keycloak, or None if it does not exist."""
+    url = f"{KEYCLOAK_URL}/admin/realms/{REALM_NAME}/users/{keycloak_user_id}"
+    headers = {"Authorization": f"Bearer {admin_token(token)}"}
+
+    response = keycloak_request("GET", url, headers=headers)
+    if response.status_code == 404:
+        return None
+    if response.status_code == 401 and token is None:
+        client_token_manager.invalidate()
+    response.raise_for_status()
+    return response.json()
+
+
+def find_users_in_keycloak(username, token=None):
+    """Look users up by exact username."""
+    url = f"{KEYCLOAK_URL}/admin/realms/{REALM_NAME}/users"
+    headers = {"Authorization": f"Bearer {admin_token(token)}"}
+
+    response = keycloak_request("GET", url, headers=headers, params={"username": username, "exact": "true"})
+    response.raise_for_status()
+    return response.json()
 
 
 def create_user_in_keycloak(user_data):
@@ -103,7 +175,7 @@ def create_user_in_keycloak(user_data):
     url = f"{KEYCLOAK_URL}/admin/realms/{REALM_NAME}/users"
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
 
-    response = requests.post(url, json=user_data, headers=headers)
+    response = keycloak_request("POST", url, json=user_data, headers=headers)
 
     if response.status_code == 201:
         # Extract the Keycloak user ID from the 'Location' header
@@ -147,10 +219,10 @@ def update_user_in_keycloak(token, keycloak_id, updated_data):
 
     # Proceed with the update if the checks pass
     url = f"{KEYCLOAK_URL}/admin/realms/{REALM_NAME}/users/{keycloak_id}"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    headers = {"Authorization": f"Bearer {admin_token(token)}", "Content-Type": "application/json"}
 
     # Send the PUT request
-    response = requests.put(url, json=updated_data, headers=headers)
+    response = keycloak_request("PUT", url, json=updated_data, headers=headers)
 
     if response.status_code == 204:
         define_logger(
@@ -179,22 +251,21 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
         if token.startswith("Bearer "):
             token = token[len("Bearer ") :]
 
-        key_der_base64 = keycloak_openid.public_key()
-        key_der = b64decode(key_der_base64.encode())
-        public_key = serialization.load_der_public_key(key_der)
-
-        # Decode JWT token
-        user_base_detail = jwt.decode(
-            token, public_key, algorithms=["RS256"], audience="account"
-        )
+        # Verify JWT token against the cached realm keys
+        user_base_detail = jwks_verifier.decode(token)
+        if revocation_list.is_revoked(user_base_detail):
+            raise HTTPException(status_code=401, detail="Session has been revoked")
 
         # Debugging: print decoded user details
         # print("Decoded user details:", user_base_detail)
-        keycloak_admin = keycloak_instance()
         sid = user_base_detail["sid"]
+        if config["auth_mode"] == "local" and "sub" in user_base_detail:
+            # Signature is valid; trust the locally cached status record
+            return {**resolve_local_principal(user_base_detail), "sid": sid}
+
         # Check if the token is active and user exists
         if "sub" in user_base_detail:
-            user = keycloak_admin.get_user(user_base_detail["sub"])
+            user = get_user_in_keycloak(user_base_detail["sub"])
             if user:
                 enabled = user.get("enabled")
                 if not enabled:
@@ -270,22 +341,21 @@ def decode_token(token: str):
         if token.startswith("Bearer "):
             token = token[len("Bearer ") :]
 
-        key_der_base64 = keycloak_openid.public_key()
-        key_der = b64decode(key_der_base64.encode())
-        public_key = serialization.load_der_public_key(key_der)
-
-        # Decode JWT token
-        user_base_detail = jwt.decode(
-            token, public_key, algorithms=["RS256"], audience="account"
-        )
+        # Verify JWT token against the cached realm keys
+        user_base_detail = jwks_verifier.decode(token)
+        if revocation_list.is_revoked(user_base_detail):
+            raise HTTPException(status_code=401, detail="Session has been revoked")
 
         # Debugging: print decoded user details
         # print("Decoded user details:", user_base_detail)
-        keycloak_admin = keycloak_instance()
         sid = user_base_detail["sid"]
+        if config["auth_mode"] == "local" and "sub" in user_base_detail:
+            # Signature is valid; trust the locally cached status record
+            return {**resolve_local_principal(user_base_detail), "sid": sid}
+
         # Check if the token is active and user exists
         if "sub" in user_base_detail:
-            user = keycloak_admin.get_user(user_base_detail["sub"])
+            user = get_user_in_keycloak(user_base_detail["sub"])
             if user:
                 enabled = user.get("enabled")
                 if not enabled:
@@ -372,7 +442,7 @@ def authenticate_with_keycloak(username: str, passcode: str) -> dict:
         "client_secret": CLIENT_SECRET,
     }
 
-    response = requests.post(url, data=data, headers=headers)
+    response = keycloak_request("POST", url, data=data, headers=headers)
 
     if response.status_code == 200:
             # Return only needed fields
@@ -392,7 +462,7 @@ def set_user_password(token, keycloak_user_id, new_password, temporary=None):
     Set a new password for a user in Keycloak, marking it as non-temporary.
     """
     url = f"{KEYCLOAK_URL}/admin/realms/{REALM_NAME}/users/{keycloak_user_id}/reset-password"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    headers = {"Authorization": f"Bearer {admin_token(token)}", "Content-Type": "application/json"}
 
     if temporary == True:
         temp = True
@@ -406,7 +476,7 @@ def set_user_password(token, keycloak_user_id, new_password, temporary=None):
     }
 
     # Send the password reset request
-    response = requests.put(url, json=data, headers=headers)
+    response = keycloak_request("PUT", url, json=data, headers=headers)
 
     if response.status_code == 204:
         None
@@ -442,7 +512,7 @@ def refresh_access_token(refresh_token: str) -> dict:
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
 
     # Send the POST request to get the new access token
-    response = requests.post(url, data=data, headers=headers)
+    response = keycloak_request("POST", url, data=data, headers=headers)
 
     if response.status_code == 200:
         token_data = response.json()
@@ -470,8 +540,53 @@ def refresh_access_token(refresh_token: str) -> dict:
 def delete_user_in_keycloak(token, keycloak_user_id):
     """Delete a user in Keycloak using the client access token and return the Keycloak user ID.
     """
-    keycloak_admin = keycloak_instance()
-    keycloak_admin.delete_user(keycloak_user_id)
+    url = f"{KEYCLOAK_URL}/admin/realms/{REALM_NAME}/users/{keycloak_user_id}"
+    headers = {"Authorization": f"Bearer {admin_token(token)}"}
+
+    response = keycloak_request("DELETE", url, headers=headers)
+    if response.status_code not in (204, 404):
+        define_logger(
+            level=40,
+            message=f"Failed to delete user {keycloak_user_id}",
+            pid=os.getpid(),
+            loggName=inspect.stack()[0],
+            body={"error": response.content},
+        )
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"Failed to delete user {keycloak_user_id}: {response.content}",
+        )
+    return keycloak_user_id
+
+
+def partial_import_users(users, if_resource_exists="SKIP", token=None):
+    """
+    Create many users in one call through the realm partial-import endpoint.
+
+    Returns Keycloak's report; ``results`` holds one entry per user with its
+    ``action`` (ADDED / SKIPPED / OVERWRITTEN), ``resourceName`` (username)
+    and ``id``.
+    """
+    url = f"{KEYCLOAK_URL}/admin/realms/{REALM_NAME}/partialImport"
+    headers = {"Authorization": f"Bearer {admin_token(token)}", "Content-Type": "application/json"}
+    data = {"ifResourceExists": if_resource_exists, "users": users}
+
+    response = keycloak_request("POST", url, json=data, headers=headers)
+    if response.status_code != 200:
+        define_logger(
+            level=40,
+            message=f"Partial import of {len(users)} users failed",
+            pid=os.getpid(),
+            loggName=inspect.stack()[0],
+            body={"error": response.content},
+        )
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"Failed to import users: {response.content}",
+        )
+    return response.json()
+
+
 def logout_user_session(session_id):
     """
     Logout a specific user session in Keycloak.
@@ -483,7 +598,8 @@ def logout_user_session(session_id):
     url = f"{KEYCLOAK_URL}/admin/realms/{REALM_NAME}/sessions/{session_id}"
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
 
-    response = requests.delete(url, headers=headers)
+    response = keycloak_request("DELETE", url, headers=headers)
+    revocation_list.revoke_session(session_id)
     if response.status_code == 204:
         define_logger(
             level=20,
@@ -517,11 +633,12 @@ def logout_all_user_sessions(token, keycloak_user_id):
     Logout all active sessions for a user in Keycloak.
     """
     url = f"{KEYCLOAK_URL}/admin/realms/{REALM_NAME}/users/{keycloak_user_id}/logout"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    headers = {"Authorization": f"Bearer {admin_token(token)}", "Content-Type": "application/json"}
 
-    response = requests.post(url, headers=headers)
+    response = keycloak_request("POST", url, headers=headers)
 
     if response.status_code == 204:
+        revocation_list.revoke_user(keycloak_user_id)
         define_logger(
             level=20,
             message=f"All sessions for user {keycloak_user_id} logged out successfully",
@@ -0,0 +1,519 @@
+"""
+Async equivalents of ``app.core.keycloak`` built on one shared httpx client.
+
+All calls go through a single keep-alive connection pool, so routes can
+``await`` auth and user-admin operations without paying TCP/TLS setup per
+call or holding a threadpool slot while Keycloak answers.
+"""
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+
+import httpx
+from fastapi import Depends, HTTPException
+from jwt.exceptions import DecodeError, InvalidTokenError
+from starlette.concurrency import run_in_threadpool
+
+from app.core.audit_log import define_logger
+from app.core.circuit_breaker import backoff_delay, keycloak_breaker
+from app.core.config import config
+from app.core.exceptions import ServiceUnavailable
+from app.core.jwks import jwks_verifier
+from app.core.revocation import revocation_list
+from app.core.keycloak import (
+    CLIENT_ID,
+    CLIENT_SECRET,
+    KEYCLOAK_URL,
+    MAX_RETRIES,
+    REALM_NAME,
+    oauth2_scheme,
+)
+from app.core.singleflight import AsyncSingleFlight
+from app.core.token_manager import AsyncClientTokenManager
+from app.repositories.user import user_repository
+
+TOKEN_URL = f"{KEYCLOAK_URL}/realms/{REALM_NAME}/protocol/openid-connect/token"
+ADMIN_URL = f"{KEYCLOAK_URL}/admin/realms/{REALM_NAME}"
+
+
+class AsyncKeycloakClient:
+    """Process-wide httpx.AsyncClient with a bounded keep-alive pool."""
+
+    def __init__(self, timeout: float = 5, max_connections: int = 100, max_keepalive_connections: int = 20):
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so it binds to the running event loop.
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    async def request(self, method: str, url: str, timeout: float = None, **kwargs) -> httpx.Response:
+        """
+        Send a request through the shared pool and the Keycloak circuit
+        breaker; ``timeout`` overrides the default.
+        """
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        keycloak_breaker.before_call()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            keycloak_breaker.record_failure()
+            raise
+        if response.status_code >= 500:
+            keycloak_breaker.record_failure()
+        else:
+            keycloak_breaker.record_success()
+        return response
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+keycloak_client = AsyncKeycloakClient(
+    timeout=config["keycloak_timeout"],
+    max_connections=config["keycloak_max_connections"],
+    max_keepalive_connections=config["keycloak_max_keepalive"],
+)
+
+
+async def request_client_token(timeout: float = None) -> dict:
+    """Request a new client credentials token from Keycloak, with retry logic."""
+    data = {
+        "grant_type": "client_credentials",
+        "client_id": CLIENT_ID,
+        "client_secret": CLIENT_SECRET,
+    }
+
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            response = await keycloak_client.request("POST", TOKEN_URL, data=data, timeout=timeout)
+            response.raise_for_status()
+            token = response.json()
+            if token.get("access_token"):
+                return token
+            define_logger(
+                level=40,
+                message="Client Access Token is missing in response",
+                pid=os.getpid(),
+                loggName=inspect.stack()[0],
+            )
+            raise HTTPException(
+                status_code=500, detail="Client Access Token not found in response"
+            )
+
+        except httpx.HTTPError as e:
+            if attempt == MAX_RETRIES:
+                define_logger(
+                    level=40,
+                    message=f"Failed to connect to Keycloak after multiple attempts: {e}",
+                    pid=os.getpid(),
+                    loggName=inspect.stack()[0],
+                )
+                raise ServiceUnavailable(
+                    detail="Keycloak not reachable after multiple attempts",
+                )
+            await asyncio.sleep(backoff_delay(attempt))
+
+
+# Admin token shared by every async admin call in this process
+client_token_manager = AsyncClientTokenManager(fetch=request_client_token)
+
+
+async def get_client_access_token() -> str:
+    """Get a cached access token using client credentials."""
+    return await client_token_manager.get_token()
+
+
+async def admin_headers(token: str = None) -> dict:
+    """Headers for an admin call, using the shared admin token unless one is given."""
+    token = token or await client_token_manager.get_token()
+    return {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+
+async def get_user_in_keycloak(keycloak_user_id, token=None, timeout: float = None):
+    """Fetch a user representation from Keycloak, or None if it does not exist."""
+    response = await keycloak_client.request(
+        "GET", f"{ADMIN_URL}/users/{keycloak_user_id}", headers=await admin_headers(token), timeout=timeout
+    )
+    if response.status_code == 404:
+        return None
+    if response.status_code == 401 and token is None:
+        client_token_manager.invalidate()
+    response.raise_for_status()
+    return response.json()
+
+
+async def find_users_in_keycloak(username, token=None, timeout: float = None):
+    """Look users up by exact username."""
+    response = await keycloak_client.request(
+        "GET",
+        f"{ADMIN_URL}/users",
+        params={"username": username, "exact": "true"},
+        headers=await admin_headers(token),
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+async def create_user_in_keycloak(user_data, token=None, timeout: float = None):
+    """Create a user in Keycloak and return the Keycloak user ID."""
+    response = await keycloak_client.request(
+        "POST", f"{ADMIN_URL}/users", json=user_data, headers=await admin_headers(token), timeout=timeout
+    )
+
+    if response.status_code == 201:
+        location_header = response.headers.get("Location")
+        if location_header:
+            keycloak_user_id = location_header.split("/")[-1]
+            define_logger(
+                level=20,
+                message=f"User {user_data['username']} created with Keycloak ID {keycloak_user_id}",
+                pid=os.getpid(),
+                loggName=inspect.stack()[0],
+            )
+            return keycloak_user_id
+        define_logger(
+            level=40,
+            message=f"User {user_data['username']} created but Keycloak ID not found",
+            pid=os.getpid(),
+            loggName=inspect.stack()[0],
+        )
+        raise HTTPException(
+            status_code=500,
+            detail=f"User {user_data['username']} created but Keycloak ID not found",
+        )
+    define_logger(
+        level=40,
+        message=f"Failed to create user {user_data['username']}: {response.content}",
+        pid=os.getpid(),
+        loggName=inspect.stack()[0],
+    )
+    raise HTTPException(
+        status_code=500,
+        detail=f"Failed to create user {user_data['username']}: {response.content}",
+    )
+
+
+async def update_user_in_keycloak(token, keycloak_id, updated_data, timeout: float = None):
+    """Update a user representation in Keycloak."""
+    response = await keycloak_client.request(
+        "PUT", f"{ADMIN_URL}/users/{keycloak_id}", json=updated_data, headers=await admin_headers(token), timeout=timeout
+    )
+
+    if response.status_code == 204:
+        define_logger(
+            level=20,
+            message=f"User with ID {keycloak_id} updated successfully",
+            pid=os.getpid(),
+            loggName=inspect.stack()[0],
+        )
+        return
+    define_logger(
+        level=40,
+        message=f"Failed to update user with ID {keycloak_id}: {response.content}",
+        pid=os.getpid(),
+        loggName=inspect.stack()[0],
+    )
+    raise HTTPException(
+        status_code=500,
+        detail=f"Failed to update user with ID {keycloak_id}: {response.content}",
+    )
+
+
+async def set_user_password(token, keycloak_user_id, new_password, temporary=None, timeout: float = None):
+    """Set a new password for a user in Keycloak."""
+    data = {
+        "type": "password",
+        "temporary": temporary is True,
+        "value": new_password,
+    }
+    response = await keycloak_client.request(
+        "PUT",
+        f"{ADMIN_URL}/users/{keycloak_user_id}/reset-password",
+        json=data,
+        headers=await admin_headers(token),
+        timeout=timeout,
+    )
+
+    if response.status_code != 204:
+        define_logger(
+            level=40,
+            message=f"Failed to update password for user {keycloak_user_id}",
+            pid=os.getpid(),
+            loggName=inspect.stack()[0],
+            body={"error": response.content},
+        )
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"Failed to update password for user {keycloak_user_id}: {response.content}",
+        )
+
+
+async def delete_user_in_keycloak(token, keycloak_user_id, timeout: float = None):
+    """Delete a user in Keycloak and return the Keycloak user ID."""
+    response = await keycloak_client.request(
+        "DELETE", f"{ADMIN_URL}/users/{keycloak_user_id}", headers=await admin_headers(token), timeout=timeout
+    )
+    if response.status_code not in (204, 404):
+        define_logger(
+            level=40,
+            message=f"Failed to delete user {keycloak_user_id}",
+            pid=os.getpid(),
+            loggName=inspect.stack()[0],
+            body={"error": response.content},
+        )
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"Failed to delete user {keycloak_user_id}: {response.content}",
+        )
+    return keycloak_user_id
+
+
+async def partial_import_users(users, if_resource_exists="SKIP", token=None, timeout: float = None):
+    """Create many users in one call through the realm partial-import endpoint."""
+    data = {"ifResourceExists": if_resource_exists, "users": users}
+    response = await keycloak_client.request(
+        "POST", f"{ADMIN_URL}/partialImport", json=data, headers=await admin_headers(token), timeout=timeout
+    )
+    if response.status_code != 200:
+        define_logger(
+            level=40,
+            message=f"Partial import of {len(users)} users failed",
+            pid=os.getpid(),
+            loggName=inspect.stack()[0],
+            body={"error": response.content},
+        )
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"Failed to import users: {response.content}",
+        )
+    return response.json()
+
+
+async def logout_user_session(session_id, timeout: float = None):
+    """Logout a specific user session in Keycloak."""
+    response = await keycloak_client.request(
+        "DELETE", f"{ADMIN_URL}/sessions/{session_id}", headers=await admin_headers(), timeout=timeout
+    )
+    # Revoke locally even if Keycloak already forgot the session
+    await run_in_threadpool(revocation_list.revoke_session, session_id)
+    if response.status_code == 204:
+        define_logger(
+            level=20,
+            message=f"Session {session_id} logged out successfully",
+            pid=os.getpid(),
+            loggName=inspect.stack()[0],
+        )
+    elif response.status_code == 404:
+        define_logger(
+            level=40,
+            message=f"Session {session_id} not found",
+            pid=os.getpid(),
+            loggName=inspect.stack()[0],
+        )
+    else:
+        define_logger(
+            level=40,
+            message=f"Failed to logout session {session_id}",
+            pid=os.getpid(),
+            loggName=inspect.stack()[0],
+            body={"error": response.content},
+        )
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"Failed to logout session {session_id}: {response.content}",
+        )
+
+
+async def logout_all_user_sessions(token, keycloak_user_id, timeout: float = None):
+    """Logout all active sessions for a user in Keycloak."""
+    response = await keycloak_client.request(
+        "POST", f"{ADMIN_URL}/users/{keycloak_user_id}/logout", headers=await admin_headers(token), timeout=timeout
+    )
+    if response.status_code == 204:
+        await run_in_threadpool(revocation_list.revoke_user, keycloak_user_id)
+        define_logger(
+            level=20,
+            message=f"All sessions for user {keycloak_user_id} logged out successfully",
+            pid=os.getpid(),
+            loggName=inspect.stack()[0],
+        )
+        return
+    raise HTTPException(
+        status_code=response.status_code,
+        detail=f"Failed to logout all sessions for user {keycloak_user_id}: {response.content}",
+    )
+
+
+async def authenticate_with_keycloak(username: str, passcode: str, timeout: float = None) -> dict:
+    """Authenticate a user with Keycloak using their credentials."""
+    data = {
+        "grant_type": "password",
+        "client_id": CLIENT_ID,
+        "username": username,
+        "password": passcode,
+        "client_secret": CLIENT_SECRET,
+    }
+    response = await keycloak_client.request("POST", TOKEN_URL, data=data, timeout=timeout)
+
+    if response.status_code == 200:
+        resp = response.json()
+        return {
+            "access_token": resp["access_token"],
+            "refresh_token": resp["refresh_token"],
+            "expires_in": resp["expires_in"],
+            "refresh_expires_in": resp["refresh_expires_in"],
+            "token_type": resp["token_type"],
+        }
+    raise HTTPException(status_code=401, detail="Invalid username or password")
+
+
+# Concurrent refreshes of the same refresh token share one grant
+refresh_coalescer = AsyncSingleFlight(result_ttl=config["refresh_coalesce_window"])
+
+
+async def refresh_access_token(refresh_token: str, timeout: float = None) -> dict:
+    """
+    Refresh the access token using the refresh token. Duplicate refreshes of
+    the same token (client retries, several tabs) are coalesced into one
+    Keycloak call whose result is shared for a short window, so Keycloak's
+    refresh-token rotation does not reject the losers.
+    """
+    key = hashlib.sha256(refresh_token.encode()).hexdigest()
+    tokens = await refresh_coalescer.do(key, lambda: _request_token_refresh(refresh_token, timeout))
+    return dict(tokens)
+
+
+async def _request_token_refresh(refresh_token: str, timeout: float = None) -> dict:
+    data = {
+        "grant_type": "refresh_token",
+        "client_id": CLIENT_ID,
+        "client_secret": CLIENT_SECRET,
+        "refresh_token": refresh_token,
+    }
+    response = await keycloak_client.request("POST", TOKEN_URL, data=data, timeout=timeout)
+
+    if response.status_code == 200:
+        token_data = response.json()
+        return {
+            "access_token": token_data["access_token"],
+            "refresh_token": token_data["refresh_token"],
+            "expires_in": token_data["expires_in"],
+            "refresh_expires_in": token_data["refresh_expires_in"],
+            "token_type": token_data["token_type"],
+        }
+    try:
+        error = response.json().get("error_description", response.content)
+    except json.JSONDecodeError:
+        error = response.content
+    define_logger(
+        level=40,
+        message="Failed to refresh token",
+        pid=os.getpid(),
+        loggName=inspect.stack()[0],
+        body={"error": error},
+    )
+    raise HTTPException(
+        status_code=response.status_code,
+        detail="Session expired. Please log in again.",
+    )
+
+
+async def resolve_local_principal(user_base_detail: dict) -> dict:
+    """Resolve the caller from a verified token without asking Keycloak."""
+    user_id = user_base_detail.get("preferred_username")
+    if not user_id:
+        raise HTTPException(status_code=400, detail="Invalid token structure")
+    user = await user_repository().get_user_by_id(user_id)
+    if user.get("status") != "ACTIVE":
+        raise HTTPException(status_code=401, detail="User is disabled")
+    return user
+
+
+async def decode_token(token: str) -> dict:
+    """Verify a bearer token and return the matching user document."""
+    try:
+        if token.startswith("Bearer "):
+            token = token[len("Bearer ") :]
+
+        # Verify JWT token against the cached realm keys
+        user_base_detail = await jwks_verifier.decode_async(token)
+        if revocation_list.is_revoked(user_base_detail):
+            raise HTTPException(status_code=401, detail="Session has been revoked")
+        if "sub" not in user_base_detail:
+            define_logger(
+                level=40,
+                message="Invalid token structure",
+                pid=os.getpid(),
+                loggName=inspect.stack()[0],
+            )
+            raise HTTPException(status_code=400, detail="Invalid token structure")
+
+        sid = user_base_detail.get("sid")
+        if config["auth_mode"] == "local":
+            return {**await resolve_local_principal(user_base_detail), "sid": sid}
+
+        user = await get_user_in_keycloak(user_base_detail["sub"])
+        if not user:
+            define_logger(
+                level=40,
+                message="User not found",
+                pid=os.getpid(),
+                loggName=inspect.stack()[0],
+            )
+            raise HTTPException(status_code=404, detail="User not found")
+        if not user.get("enabled"):
+            raise HTTPException(status_code=401, detail="User is disabled")
+        user = await user_repository().get_user_by_id(user["username"])
+        return {**user, "sid": sid}
+
+    except (DecodeError, InvalidTokenError) as exception:
+        define_logger(
+            level=40,
+            message="Invalid or expired token",
+            pid=os.getpid(),
+            loggName=inspect.stack()[0],
+        )
+        raise HTTPException(
+            status_code=401, detail="Invalid or expired token"
+        ) from exception
+
+    except HTTPException as exception:
+        define_logger(
+            level=40,
+            message="Unknown HTTP error",
+            pid=os.getpid(),
+            loggName=inspect.stack()[0],
+            body={"error": str(exception)},
+        )
+        raise
+
+    except Exception as exception:
+        define_logger(
+            level=40,
+            message="Internal Server Error",
+            pid=os.getpid(),
+            loggName=inspect.stack()[0],
+            body={"error": str(exception)},
+        )
+        raise HTTPException(
+            status_code=500, detail="Internal Server Error"
+        ) from exception
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+    """FastAPI dependency resolving the authenticated user without a threadpool hop."""
+    return await decode_token(token)
@@ -0,0 +1,95 @@
+"""Keyset (cursor) pagination over ``_id``."""
+import base64
+import binascii
+from typing import Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Query
+from pymongo import ASCENDING
+from pymongo.collection import Collection
+
+from app.core.config import config
+
+
+def encode_cursor(last_id: ObjectId) -> str:
+    return base64.urlsafe_b64encode(last_id.binary).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> ObjectId:
+    try:
+        return ObjectId(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, InvalidId, ValueError, TypeError):
+        raise HTTPException(400, "Invalid cursor")
+
+
+class PageParams:
+    """``?cursor=&limit=`` query parameters, usable as a route dependency."""
+
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        limit: int = Query(config["page_size_default"], ge=1, le=config["page_size_max"]),
+    ):
+        self.cursor = cursor
+        self.limit = limit
+
+
+def encode_position(position: int) -> str:
+    """Opaque cursor for lists keyed by a running number rather than ``_id``."""
+    return base64.urlsafe_b64encode(str(position).encode("ascii")).decode("ascii").rstrip("=")
+
+
+def decode_position(cursor: str) -> int:
+    try:
+        return int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii"))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(400, "Invalid cursor")
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    return min(limit or config["page_size_default"], config["page_size_max"])
+
+
+def _page_query(query: dict, cursor: Optional[str], limit: Optional[int]):
+    """Filter and fetch size (one extra row tells whether another page exists)."""
+    limit = clamp_limit(limit)
+    if cursor:
+        query = {**query, "_id": {"$gt": decode_cursor(cursor)}}
+    return query, limit
+
+
+def _with_id(projection: Optional[dict]) -> Optional[dict]:
+    """The cursor needs ``_id``: drop any ``_id`` exclusion (it is stripped from the items later)."""
+    projection = {key: value for key, value in (projection or {}).items() if key != "_id"}
+    return projection or None
+
+
+def _build_page(docs: list, limit: int) -> dict:
+    next_cursor = encode_cursor(docs[limit - 1]["_id"]) if len(docs) > limit else None
+    items = docs[:limit]
+    for doc in items:
+        doc.pop("_id", None)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def fetch_page(collection: Collection, query: dict, projection: dict = None,
+               cursor: Optional[str] = None, limit: Optional[int] = None) -> dict:
+    """
+    One page of ``query`` in ``_id`` order. The query's equality fields
+    followed by ``_id`` should be indexed (see app.core.indexes) so each page
+    is an index range scan however deep the client pages.
+    """
+    query, limit = _page_query(query, cursor, limit)
+    projection = _with_id(projection)
+    docs = list(collection.find(query, projection).sort("_id", ASCENDING).limit(limit + 1))
+    return _build_page(docs, limit)
+
+
+async def fetch_page_async(collection, query: dict, projection: dict = None,
+                           cursor: Optional[str] = None, limit: Optional[int] = None) -> dict:
+    """Motor version of fetch_page."""
+    query, limit = _page_query(query, cursor, limit)
+    projection = _with_id(projection)
+    docs = await collection.find(query, projection).sort("_id", ASCENDING).limit(limit + 1).to_list(length=limit + 1)
+    return _build_page(docs, limit)
@@ -0,0 +1,57 @@
+"""Mongo projections derived from response models, with ``?fields=`` sparse fieldsets."""
+from functools import lru_cache
+from typing import Iterable, List, Optional, Type
+
+from fastapi import HTTPException, Query
+from pydantic import BaseModel, create_model
+
+
+def model_fields(model: Type[BaseModel]) -> List[str]:
+    return [field.alias or name for name, field in model.model_fields.items()]
+
+
+def model_projection(
+    model: Type[BaseModel],
+    fields: Optional[Iterable[str]] = None,
+    exclude: Iterable[str] = (),
+    extra: Iterable[str] = (),
+) -> dict:
+    """
+    Inclusion projection for the fields ``model`` serializes, so nothing the
+    response would drop (payment details, pictures, ...) is read from Mongo.
+    ``fields`` narrows it to a client-requested subset; ``exclude`` drops
+    fields from the default set; ``extra`` adds fields the service needs.
+    """
+    allowed = model_fields(model)
+    if fields:
+        unknown = sorted(set(fields) - set(allowed))
+        if unknown:
+            raise HTTPException(400, f"Unknown fields: {', '.join(unknown)}")
+        selected = [name for name in allowed if name in fields]
+    else:
+        selected = [name for name in allowed if name not in exclude]
+    return {"_id": 0, **{name: 1 for name in [*selected, *extra]}}
+
+
+@lru_cache(maxsize=None)
+def partial_model(model: Type[BaseModel]) -> Type[BaseModel]:
+    """``model`` with every field optional, for responses limited by ``?fields=``."""
+    return create_model(
+        f"Partial{model.__name__}",
+        **{name: (Optional[field.annotation], None) for name, field in model.model_fields.items()},
+    )
+
+
+def field_projection(model: Type[BaseModel], exclude: Iterable[str] = ()):
+    """Route dependency turning ``?fields=a,b`` into a projection of ``model``."""
+    exclude = tuple(exclude)
+
+    def dependency(
+        fields: Optional[str] = Query(
+            None, description=f"Comma-separated subset of: {', '.join(model_fields(model))}"
+        ),
+    ) -> dict:
+        requested = [name.strip() for name in fields.split(",") if name.strip()] if fields else None
+        return model_projection(model, requested, exclude=exclude)
+
+    return dependency
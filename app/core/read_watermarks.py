@@ -0,0 +1,98 @@
+"""Read receipts as per-user watermarks, aggregated in memory and flushed in bulk."""
+import asyncio
+import inspect
+import os
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from bson import ObjectId
+
+from app.core.audit_log import define_logger
+from app.core.cache import TTLCache
+
+# (project_id, user_id, last_read_id)
+Watermark = Tuple[str, str, ObjectId]
+
+
+class ReadWatermarks:
+    """
+    "Read up to message X" per user and project. A receipt only raises the
+    in-memory watermark (message ids grow with time), so any number of
+    receipts between two flushes cost one write per user and project;
+    ``flush`` hands the pending ones to ``save`` (a ``bulk_write`` of
+    ``$max`` upserts) every ``flush_interval`` seconds. Recent watermarks
+    are also kept in a TTL cache to tell whether a receipt moves anything.
+    """
+
+    def __init__(self, save: Callable[[List[Watermark]], Awaitable], flush_interval: float = 5,
+                 maxsize: int = 100000, ttl: float = 3600):
+        self._save = save
+        self.flush_interval = flush_interval
+        self._pending = {}  # (project_id, user_id) -> ObjectId
+        self._known = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._counters = {"receipts": 0, "advanced": 0, "flushes": 0, "written": 0, "flush_errors": 0}
+        self._flush_ms = {"last": 0.0, "max": 0.0}
+
+    def advances(self, project_id: str, user_id: str, message_id: ObjectId) -> bool:
+        """Whether a receipt for ``message_id`` would move the known watermark."""
+        key = (project_id, user_id)
+        current = self._pending.get(key) or self._known.get(key)
+        return current is None or message_id > current
+
+    def mark(self, project_id: str, user_id: str, message_id: ObjectId) -> bool:
+        """Record a receipt; True when it moves the user's watermark forward."""
+        self._counters["receipts"] += 1
+        if not self.advances(project_id, user_id, message_id):
+            return False
+        key = (project_id, user_id)
+        self._pending[key] = message_id
+        self._known.set(key, message_id)
+        self._counters["advanced"] += 1
+        return True
+
+    def pending(self, project_id: str, user_id: str) -> Optional[ObjectId]:
+        """A watermark not flushed yet, to combine with the stored one."""
+        return self._pending.get((project_id, user_id))
+
+    def pending_for_project(self, project_id: str) -> dict:
+        return {user_id: mark for (project, user_id), mark in self._pending.items() if project == project_id}
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        started = time.perf_counter()
+        try:
+            await self._save([(project_id, user_id, mark) for (project_id, user_id), mark in batch.items()])
+        except Exception as exc:
+            # Keep them for the next flush; newer receipts win
+            for key, mark in batch.items():
+                if key not in self._pending or self._pending[key] < mark:
+                    self._pending[key] = mark
+            self._counters["flush_errors"] += 1
+            define_logger(
+                level=40,
+                message=f"Failed to flush {len(batch)} read watermarks: {exc}",
+                pid=os.getpid(),
+                loggName=inspect.stack()[0],
+            )
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        self._counters["flushes"] += 1
+        self._counters["written"] += len(batch)
+        self._flush_ms["last"] = elapsed
+        self._flush_ms["max"] = max(self._flush_ms["max"], elapsed)
+
+    async def run_flusher(self):
+        """Background task flushing pending watermarks every ``flush_interval`` seconds."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            **self._counters,
+            "pending": len(self._pending),
+            "flush_ms_last": round(self._flush_ms["last"], 2),
+            "flush_ms_max": round(self._flush_ms["max"], 2),
+        }
@@ -0,0 +1,171 @@
+"""Hot in-memory window of the latest chat messages of active projects."""
+import json
+from collections import OrderedDict, deque
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+
+# Rough per-record bookkeeping on top of the string payloads, for the memory cap
+_RECORD_OVERHEAD = 200
+
+
+class RecentMessage:
+    """One buffered message; slotted to keep thousands of them cheap."""
+
+    __slots__ = ("id", "user_id", "message", "role", "user_name", "timestamp", "size")
+
+    def __init__(self, id: ObjectId, user_id: str, message: str, role: str, user_name: str, timestamp: str):
+        self.id = id
+        self.user_id = user_id
+        self.message = message
+        self.role = role
+        self.user_name = user_name
+        self.timestamp = timestamp
+        self.size = _RECORD_OVERHEAD + len(message) + len(user_id) + len(user_name or "") + len(timestamp)
+
+    @classmethod
+    def from_message(cls, message: dict) -> "RecentMessage":
+        """From a stored document (``_id``) or an API/frame dict (``message_id``)."""
+        message_id = message["_id"] if "_id" in message else ObjectId(message["message_id"])
+        return cls(message_id, message["user_id"], message["message"], message["role"],
+                   message.get("user_name"), message["timestamp"])
+
+    def to_dict(self, project_id: str) -> dict:
+        return {
+            "project_id": project_id,
+            "user_id": self.user_id,
+            "message": self.message,
+            "role": self.role,
+            "user_name": self.user_name,
+            "timestamp": self.timestamp,
+            "message_id": str(self.id),
+        }
+
+
+class _ProjectBuffer:
+    __slots__ = ("records", "seeded", "complete")
+
+    def __init__(self, capacity: int):
+        self.records = deque(maxlen=capacity)  # oldest first, by id
+        self.seeded = False    # holds every message newer than its oldest record
+        self.complete = False  # ...and there is nothing older in Mongo
+
+
+class RecentMessages:
+    """
+    Per-project ring buffers of the latest ``per_project`` messages, kept
+    in _id order. A buffer answers history requests once it has been
+    seeded from Mongo; from then on it stays exact because every new
+    message of the project is appended (by ``log_chat``, and from other
+    workers' broker frames). Buffers are evicted least recently used once
+    all of them together exceed ``max_bytes``.
+    """
+
+    def __init__(self, per_project: int, max_bytes: int):
+        self.per_project = per_project
+        self.max_bytes = max_bytes
+        self._projects = OrderedDict()  # project_id -> _ProjectBuffer, least recently used first
+        self._bytes = 0
+        self._counters = {"hits": 0, "misses": 0, "seeds": 0, "evictions": 0}
+
+    def _touch(self, project_id: str) -> _ProjectBuffer:
+        buffer = self._projects.get(project_id)
+        if buffer is None:
+            buffer = self._projects[project_id] = _ProjectBuffer(self.per_project)
+        else:
+            self._projects.move_to_end(project_id)
+        return buffer
+
+    def _insert(self, buffer: _ProjectBuffer, record: RecentMessage):
+        records = buffer.records
+        position = len(records)
+        while position and records[position - 1].id >= record.id:
+            if records[position - 1].id == record.id:
+                return  # already buffered
+            position -= 1
+        if len(records) == records.maxlen:
+            if position == 0:
+                return  # older than everything kept
+            self._bytes -= records.popleft().size
+            buffer.complete = False
+            position -= 1
+        records.insert(position, record)
+        self._bytes += record.size
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._projects) > 1:
+            _, buffer = self._projects.popitem(last=False)
+            self._bytes -= sum(record.size for record in buffer.records)
+            self._counters["evictions"] += 1
+
+    def append(self, project_id: str, message: dict):
+        self._insert(self._touch(project_id), RecentMessage.from_message(message))
+        self._evict()
+
+    def append_frame(self, project_id: str, payload: str):
+        """A broadcast frame from another worker; only chat messages are kept."""
+        frame = json.loads(payload)
+        if frame.get("type") == "message" and "message_id" in frame:
+            self.append(project_id, frame)
+
+    def seed(self, project_id: str, messages: List[dict], complete: bool):
+        """Merge the latest page from Mongo (oldest first) into the buffer."""
+        buffer = self._touch(project_id)
+        for message in messages:
+            self._insert(buffer, RecentMessage.from_message(message))
+        buffer.seeded = True
+        buffer.complete = complete and len(buffer.records) < buffer.records.maxlen
+        self._counters["seeds"] += 1
+        self._evict()
+
+    def is_seeded(self, project_id: str) -> bool:
+        buffer = self._projects.get(project_id)
+        return buffer is not None and buffer.seeded
+
+    def contains(self, project_id: str, message_id: ObjectId) -> bool:
+        buffer = self._projects.get(project_id)
+        return buffer is not None and any(record.id == message_id for record in reversed(buffer.records))
+
+    def forget(self, project_id: str):
+        """Drop a buffer that will stop receiving the project's new messages."""
+        buffer = self._projects.pop(project_id, None)
+        if buffer is not None:
+            self._bytes -= sum(record.size for record in buffer.records)
+
+    def latest(self, project_id: str, limit: int) -> Optional[Tuple[List[dict], Optional[ObjectId]]]:
+        """
+        The newest ``limit`` messages oldest first, plus the id to page
+        back from over Mongo (None when nothing is older), or None on a miss.
+        """
+        buffer = self._projects.get(project_id)
+        if buffer is None or not buffer.seeded or (len(buffer.records) < limit and not buffer.complete):
+            self._counters["misses"] += 1
+            return None
+        self._projects.move_to_end(project_id)
+        self._counters["hits"] += 1
+        records = list(buffer.records)[-limit:]
+        has_older = len(buffer.records) > len(records) or not buffer.complete
+        return [record.to_dict(project_id) for record in records], (records[0].id if has_older and records else None)
+
+    def since(self, project_id: str, since_id: ObjectId) -> Optional[List[dict]]:
+        """Messages after ``since_id`` oldest first, or None when the buffer cannot vouch for them."""
+        buffer = self._projects.get(project_id)
+        if buffer is None or not buffer.seeded or (
+            not buffer.complete and (not buffer.records or since_id < buffer.records[0].id)
+        ):
+            self._counters["misses"] += 1
+            return None
+        self._projects.move_to_end(project_id)
+        self._counters["hits"] += 1
+        return [record.to_dict(project_id) for record in buffer.records if record.id > since_id]
+
+    def stats(self) -> dict:
+        lookups = self._counters["hits"] + self._counters["misses"]
+        return {
+            **self._counters,
+            "hit_rate": round(self._counters["hits"] / lookups, 3) if lookups else 0.0,
+            "projects": len(self._projects),
+            "messages": sum(len(buffer.records) for buffer in self._projects.values()),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+        }
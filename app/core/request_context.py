@@ -0,0 +1,39 @@
+"""Per-request scratch space shared by dependencies, services and repositories."""
+from contextvars import ContextVar
+from typing import Optional
+
+_request_memo: ContextVar[Optional[dict]] = ContextVar("request_memo", default=None)
+
+
+def request_memo(namespace: str) -> Optional[dict]:
+    """
+    Return the dict memoizing ``namespace`` lookups for the current HTTP
+    request, or None outside of one (websockets, startup, background tasks).
+    """
+    memo = _request_memo.get()
+    if memo is None:
+        return None
+    return memo.setdefault(namespace, {})
+
+
+class RequestContextMiddleware:
+    """
+    Pure ASGI middleware opening a fresh memo for every HTTP request.
+
+    Starlette copies the context into the threadpool for sync endpoints and
+    dependencies, so the same dict is seen everywhere while handling one
+    request and dropped when it finishes.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _request_memo.set({})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_memo.reset(token)
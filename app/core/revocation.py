@@ -0,0 +1,142 @@
+"""Local list of revoked sessions consulted during token verification."""
+import asyncio
+import inspect
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+from starlette.concurrency import run_in_threadpool
+
+from app.core.audit_log import define_logger
+from app.core.config import config
+from app.core.db import database
+
+SESSION = "sid"
+USER = "user"
+
+
+class RevocationList:
+    """
+    Revoked Keycloak sessions (``sid``) and per-user "revoked before"
+    timestamps, held in memory for O(1) checks and persisted to Mongo so
+    other workers and restarts see them. Entries live ``ttl`` seconds, the
+    longest time a token carrying the session can stay valid; a Mongo TTL
+    index (see app.core.indexes) expires them on disk.
+    """
+
+    def __init__(self, collection: Collection, ttl: int = 36000, reload_interval: float = 30):
+        self.collection = collection
+        self.ttl = ttl
+        self.reload_interval = reload_interval
+
+        self._sessions = {}        # sid -> expires_at (epoch seconds)
+        self._revoked_before = {}  # keycloak user id (sub) -> (revoked_at, expires_at)
+        self._lock = threading.Lock()
+        self._counters = {"checks": 0, "rejected": 0, "reloads": 0}
+
+    def _persist(self, kind: str, key: str, revoked_at: float, expires_at: float):
+        try:
+            self.collection.update_one(
+                {"kind": kind, "key": key},
+                {
+                    "$max": {"revoked_at": revoked_at},
+                    "$set": {"expires_at": datetime.fromtimestamp(expires_at, timezone.utc)},
+                },
+                upsert=True,
+            )
+        except PyMongoError as exc:
+            # The in-memory entry still protects this worker.
+            define_logger(
+                level=40,
+                message=f"Failed to persist revocation {kind}:{key}: {exc}",
+                pid=os.getpid(),
+                loggName=inspect.stack()[0],
+            )
+
+    def revoke_session(self, sid: str):
+        """Reject every token of this Keycloak session from now on."""
+        if not sid:
+            return
+        now = time.time()
+        with self._lock:
+            self._sessions[sid] = now + self.ttl
+        self._persist(SESSION, sid, now, now + self.ttl)
+
+    def revoke_user(self, sub: str):
+        """Reject every token issued to this Keycloak user before now."""
+        if not sub:
+            return
+        now = time.time()
+        with self._lock:
+            self._revoked_before[sub] = (now, now + self.ttl)
+        self._persist(USER, sub, now, now + self.ttl)
+
+    def is_revoked(self, claims: dict) -> bool:
+        """O(1) check of a verified token's claims against the list."""
+        self._counters["checks"] += 1
+        if claims.get("sid") in self._sessions:
+            self._counters["rejected"] += 1
+            return True
+        entry = self._revoked_before.get(claims.get("sub"))
+        # iat is whole seconds: a token from the revocation's own second is
+        # rejected too, since it may predate the revocation
+        if entry is not None and claims.get("iat", 0) <= entry[0]:
+            self._counters["rejected"] += 1
+            return True
+        return False
+
+    def load(self):
+        """Replace the in-memory view with the unexpired entries in Mongo."""
+        now = time.time()
+        sessions, revoked_before = {}, {}
+        for doc in self.collection.find(
+            {"expires_at": {"$gt": datetime.fromtimestamp(now, timezone.utc)}},
+            {"_id": 0, "kind": 1, "key": 1, "revoked_at": 1, "expires_at": 1},
+        ):
+            expires_at = doc["expires_at"].replace(tzinfo=timezone.utc).timestamp()
+            if doc["kind"] == SESSION:
+                sessions[doc["key"]] = expires_at
+            elif doc["kind"] == USER:
+                revoked_before[doc["key"]] = (doc["revoked_at"], expires_at)
+        with self._lock:
+            # Keep local entries that may not have reached Mongo yet.
+            for sid, expires_at in self._sessions.items():
+                if expires_at > now:
+                    sessions.setdefault(sid, expires_at)
+            for sub, entry in self._revoked_before.items():
+                if entry[1] > now and entry[0] > revoked_before.get(sub, (0, 0))[0]:
+                    revoked_before[sub] = entry
+            self._sessions = sessions
+            self._revoked_before = revoked_before
+        self._counters["reloads"] += 1
+
+    async def run_reloader(self):
+        """Background task picking up revocations made by other workers."""
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await run_in_threadpool(self.load)
+            except PyMongoError as exc:
+                define_logger(
+                    level=40,
+                    message=f"Failed to reload revocation list: {exc}",
+                    pid=os.getpid(),
+                    loggName=inspect.stack()[0],
+                )
+
+    def stats(self) -> dict:
+        return {
+            **self._counters,
+            "sessions": len(self._sessions),
+            "users": len(self._revoked_before),
+        }
+
+
+revocation_list = RevocationList(
+    collection=database["revoked_sessions"],
+    ttl=config["revocation_ttl"],
+    reload_interval=config["revocation_reload_interval"],
+)
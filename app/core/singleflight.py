@@ -0,0 +1,50 @@
+"""Coalescing of identical concurrent async calls."""
+import asyncio
+from typing import Awaitable, Callable
+
+from app.core.cache import TTLCache
+
+
+class AsyncSingleFlight:
+    """
+    Runs at most one call per key at a time. Callers arriving while a call
+    for their key is in flight await the same result instead of issuing
+    their own; successful results are also replayed to callers arriving
+    within ``result_ttl`` seconds afterwards. Failures are shared with the
+    callers already waiting but never cached. A caller that is cancelled
+    stops waiting; the call itself runs on for the others.
+    """
+
+    def __init__(self, result_ttl: float = 10, maxsize: int = 10000):
+        self._inflight = {}
+        self._results = TTLCache(maxsize=maxsize, ttl=result_ttl)
+        self._counters = {"upstream": 0, "coalesced": 0, "replayed": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        result = self._results.get(key)
+        if result is not None:
+            self._counters["replayed"] += 1
+            return result
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._counters["coalesced"] += 1
+        else:
+            # The upstream call runs as its own task so that no caller, the
+            # first one included, can cancel it for the others by going away.
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self._counters["upstream"] += 1
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if task.cancelled():
+            return
+        # Retrieve the exception so a failure nobody awaited is not logged.
+        if task.exception() is None:
+            self._results.set(key, task.result())
+
+    def stats(self) -> dict:
+        return {**self._counters, "in_flight": len(self._inflight)}
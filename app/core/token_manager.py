@@ -0,0 +1,139 @@
+"""Shared client-credentials token for Keycloak admin calls."""
+import asyncio
+import inspect
+import os
+import threading
+import time
+from typing import Awaitable, Callable
+
+from app.core.audit_log import define_logger
+
+
+class ClientTokenManager:
+    """
+    Caches the service account token until shortly before it expires.
+
+    ``fetch`` must return the raw token response (``access_token`` and
+    ``expires_in``). Once ``refresh_ratio`` of the lifetime has passed the
+    cached token is still handed out while a background thread fetches the
+    next one; only when the token is within ``skew`` seconds of expiry do
+    callers block on a fetch. Either way at most one fetch runs at a time.
+    """
+
+    def __init__(self, fetch: Callable[[], dict], skew: int = 30, refresh_ratio: float = 0.75):
+        self.fetch = fetch
+        self.skew = skew
+        self.refresh_ratio = refresh_ratio
+
+        self._token = None
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._counters = {"hits": 0, "fetches": 0, "background_refreshes": 0}
+
+    def _store(self, token: dict):
+        now = time.monotonic()
+        lifetime = int(token.get("expires_in") or 60)
+        self._token = token["access_token"]
+        # Short-lived tokens would never be cached with the full skew; keep it
+        # within the part of the lifetime after the refresh point.
+        skew = min(self.skew, lifetime * (1 - self.refresh_ratio))
+        self._expires_at = now + lifetime - skew
+        self._refresh_at = now + lifetime * self.refresh_ratio
+        self._counters["fetches"] += 1
+
+    def _background_refresh(self):
+        try:
+            token = self.fetch()
+            with self._lock:
+                self._store(token)
+                self._counters["background_refreshes"] += 1
+        except Exception as exc:
+            # The current token is still valid; the next caller will retry.
+            define_logger(
+                level=30,
+                message=f"Background refresh of client token failed: {exc}",
+                pid=os.getpid(),
+                loggName=inspect.stack()[0],
+            )
+        finally:
+            self._refreshing = False
+
+    def get_token(self) -> str:
+        """Return a valid admin access token, fetching one only when needed."""
+        now = time.monotonic()
+        if self._token and now < self._expires_at:
+            self._counters["hits"] += 1
+            if now >= self._refresh_at and not self._refreshing:
+                with self._lock:
+                    if not self._refreshing:
+                        self._refreshing = True
+                        threading.Thread(target=self._background_refresh, daemon=True).start()
+            return self._token
+
+        with self._lock:
+            # Another caller may have fetched while we waited for the lock.
+            if self._token and time.monotonic() < self._expires_at:
+                self._counters["hits"] += 1
+                return self._token
+            self._store(self.fetch())
+            return self._token
+
+    def invalidate(self):
+        """Forget the cached token, e.g. after Keycloak rejected it."""
+        with self._lock:
+            self._token = None
+            self._expires_at = 0.0
+
+    def stats(self) -> dict:
+        return {**self._counters, "valid": bool(self._token) and time.monotonic() < self._expires_at}
+
+
+class AsyncClientTokenManager(ClientTokenManager):
+    """
+    asyncio flavour of :class:`ClientTokenManager` for the async Keycloak
+    client: ``fetch`` is a coroutine function, the background refresh runs
+    as a task and concurrent callers wait on the same lock.
+    """
+
+    def __init__(self, fetch: Callable[[], Awaitable[dict]], skew: int = 30, refresh_ratio: float = 0.75):
+        super().__init__(fetch, skew=skew, refresh_ratio=refresh_ratio)
+        self._lock = asyncio.Lock()
+        self._refresh_task = None
+
+    async def _background_refresh(self):
+        try:
+            token = await self.fetch()
+            self._store(token)
+            self._counters["background_refreshes"] += 1
+        except Exception as exc:
+            define_logger(
+                level=30,
+                message=f"Background refresh of client token failed: {exc}",
+                pid=os.getpid(),
+                loggName=inspect.stack()[0],
+            )
+        finally:
+            self._refresh_task = None
+
+    async def get_token(self) -> str:
+        """Return a valid admin access token, fetching one only when needed."""
+        now = time.monotonic()
+        if self._token and now < self._expires_at:
+            self._counters["hits"] += 1
+            if now >= self._refresh_at and self._refresh_task is None:
+                self._refresh_task = asyncio.create_task(self._background_refresh())
+            return self._token
+
+        async with self._lock:
+            if self._token and time.monotonic() < self._expires_at:
+                self._counters["hits"] += 1
+                return self._token
+            self._store(await self.fetch())
+            return self._token
+
+    def invalidate(self):
+        """Forget the cached token, e.g. after Keycloak rejected it."""
+        self._token = None
+        self._expires_at = 0.0
@@ -0,0 +1,140 @@
+"""Write-behind batching of inserts that do not need to be awaited one by one."""
+import asyncio
+import inspect
+import os
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from app.core.audit_log import define_logger
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """
+    Buffers documents in a bounded asyncio queue and hands them to ``flush``
+    (e.g. an ``insert_many``) in batches of up to ``max_batch``, waiting at
+    most ``flush_interval`` seconds for a batch to fill. ``put`` blocks
+    while ``max_pending`` documents are waiting, which slows producers down
+    to the database's pace instead of growing memory. Documents must carry
+    their own ``_id`` so a retried batch cannot insert twice. ``close``
+    flushes whatever is still queued.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List[dict]], Awaitable],
+        name: str,
+        max_batch: int = 500,
+        flush_interval: float = 0.05,
+        max_pending: int = 10000,
+        retries: int = 3,
+    ):
+        self._flush_fn = flush
+        self.name = name
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retries = retries
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self._counters = {"enqueued": 0, "written": 0, "batches": 0, "retries": 0, "dropped": 0, "blocked_puts": 0}
+        self._flush_ms = {"last": 0.0, "max": 0.0, "total": 0.0}
+
+    def start(self):
+        """Start the flusher on the running loop."""
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._closed = False
+        self._task = asyncio.create_task(self._run())
+
+    async def put(self, doc: dict):
+        if self._closed or self._task is None:
+            # Not running (shutdown, scripts): write through
+            await self._flush([doc])
+            return
+        if self._queue.full():
+            self._counters["blocked_puts"] += 1
+        await self._queue.put(doc)
+        self._counters["enqueued"] += 1
+
+    async def close(self):
+        """Stop accepting documents and flush everything already queued."""
+        if self._task is None:
+            return
+        self._closed = True
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    def _drain(self, batch: list) -> bool:
+        """Move queued documents into ``batch``; True once the stop marker is seen."""
+        while len(batch) < self.max_batch:
+            try:
+                doc = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return False
+            if doc is _STOP:
+                return True
+            batch.append(doc)
+        return False
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is _STOP:
+                batch, stopping = [], True
+            else:
+                batch = [first]
+                stopping = self._drain(batch)
+                if not stopping and len(batch) < self.max_batch:
+                    # Give a burst a moment to fill the batch
+                    await asyncio.sleep(self.flush_interval)
+                    stopping = self._drain(batch)
+            if stopping:
+                # puts that were blocked on a full queue when close() was called
+                while not self._queue.empty():
+                    self._drain(batch)
+                    await self._flush(batch)
+                    batch = []
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        for attempt in range(self.retries + 1):
+            started = time.perf_counter()
+            try:
+                await self._flush_fn(batch)
+            except Exception as exc:
+                if attempt < self.retries:
+                    self._counters["retries"] += 1
+                    await asyncio.sleep(min(0.1 * 2 ** attempt, 2))
+                    continue
+                self._counters["dropped"] += len(batch)
+                define_logger(
+                    level=40,
+                    message=f"Write-behind {self.name}: dropped {len(batch)} documents after {attempt + 1} attempts: {exc}",
+                    pid=os.getpid(),
+                    loggName=inspect.stack()[0],
+                )
+                return
+            elapsed = (time.perf_counter() - started) * 1000
+            self._counters["written"] += len(batch)
+            self._counters["batches"] += 1
+            self._flush_ms["last"] = elapsed
+            self._flush_ms["max"] = max(self._flush_ms["max"], elapsed)
+            self._flush_ms["total"] += elapsed
+            return
+
+    def stats(self) -> dict:
+        batches = self._counters["batches"]
+        return {
+            **self._counters,
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_pending": self.max_pending,
+            "flush_ms_last": round(self._flush_ms["last"], 2),
+            "flush_ms_max": round(self._flush_ms["max"], 2),
+            "flush_ms_avg": round(self._flush_ms["total"] / batches, 2) if batches else 0.0,
+        }
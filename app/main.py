@@ -1,13 +1,28 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 
 from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY, HTTP_500_INTERNAL_SERVER_ERROR
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import JSONResponse
 from app.schemas.response import APIResponse
 
-from app.core.db import check_db_connection
+from app.core.db import async_client, check_db_connection
+from app.core.circuit_breaker import keycloak_breaker
+from app.core.indexes import index_manager
+from app.core.jwks import jwks_verifier
+from app.core.keycloak import client_token_manager
+from app.core.request_context import RequestContextMiddleware
+from app.core.revocation import revocation_list
+from app.repositories.user import user_cache
+from app.core.keycloak_async import (
+    keycloak_client,
+    client_token_manager as async_client_token_manager,
+    refresh_coalescer,
+    get_current_user,
+)
 from app.services.user import UserService
+from app.services.chat import chat_writer, read_watermarks
 
 
 from app.routes import user
@@ -15,7 +30,7 @@ from app.routes import auth
 from app.routes import chat
 from app.routes import request
 from app.routes import ticket
-import time
+import asyncio
 
 import logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
@@ -34,13 +49,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestContextMiddleware)
 
 
 # --- Global exception handlers -> uniform response ---
 @app.exception_handler(HTTPException)
 async def http_exception_handler(_: Request, exc: HTTPException):
     body = APIResponse(status_code=exc.status_code, message=str(exc.detail), data=None)
-    return JSONResponse(status_code=exc.status_code, content=body.model_dump())
+    return JSONResponse(status_code=exc.status_code, content=body.model_dump(), headers=exc.headers)
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(_: Request, exc: RequestValidationError):
@@ -70,11 +86,70 @@ user_service = UserService()
 
 
 @app.on_event("startup")
-def on_startup():
-    time.sleep(1)  # Wait for DB to be ready
+async def on_startup():
+    await asyncio.sleep(1)  # Wait for DB to be ready
     """This function will be executed when the server starts"""
-    user_service.create_root_user()
+    await user_service.create_root_user()
+    await run_in_threadpool(revocation_list.load)
+
+
+background_tasks = []
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    """Start the periodic jobs owned by this worker."""
+    # Index builds can take a while on large collections; don't hold startup
+    background_tasks.append(asyncio.create_task(run_in_threadpool(index_manager.ensure)))
+    background_tasks.append(asyncio.create_task(revocation_list.run_reloader()))
+    background_tasks.append(asyncio.create_task(user_service.run_signup_reconciler()))
+    background_tasks.append(asyncio.create_task(chat.websocket_manager.run_reaper()))
+    background_tasks.append(asyncio.create_task(read_watermarks.run_flusher()))
+    chat_writer.start()
+    await chat.websocket_manager.broker.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Flush queued chat messages and receipts, stop background jobs and release pooled connections."""
+    await chat_writer.close()
+    await chat.websocket_manager.broker.close()
+    for task in background_tasks:
+        task.cancel()
+    await read_watermarks.flush()
+    await keycloak_client.aclose()
+    async_client.close()
 
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+
+async def super_admin(user: dict = Depends(get_current_user)) -> dict:
+    """Operational endpoints expose internals; only super admins may read them."""
+    if user["role"] != "SA":
+        raise HTTPException(status_code=403, detail="Only super admin can view operational data")
+    return user
+
+
+@app.get("/metrics", dependencies=[Depends(super_admin)])
+def metrics():
+    """In-process counters for caches and integrations (super admins only)."""
+    return {
+        "jwks": jwks_verifier.stats(),
+        "user_cache": user_cache.stats(),
+        "keycloak_client_token": client_token_manager.stats(),
+        "keycloak_client_token_async": async_client_token_manager.stats(),
+        "keycloak_breaker": keycloak_breaker.stats(),
+        "token_refresh": refresh_coalescer.stats(),
+        "revocation": revocation_list.stats(),
+        "chat_writer": chat_writer.stats(),
+        "websockets": chat.websocket_manager.stats(),
+        "read_watermarks": read_watermarks.stats(),
+    }
+
+
+@app.get("/indexes", dependencies=[Depends(super_admin)])
+async def index_report():
+    """Missing, drifted, unmanaged and unused MongoDB indexes (super admins only)."""
+    return await run_in_threadpool(index_manager.report)
@@ -40,3 +40,21 @@ class ChatSessionOut(BaseModel):
     created_at: datetime
     last_updated: datetime
 
+class ChatMessageOut(BaseModel):
+    message_id: str
+    project_id: str
+    user_id: str
+    message: str
+    role: str
+    user_name: Optional[str] = None
+    timestamp: str
+
+class UnreadOut(BaseModel):
+    project_id: str
+    last_read_id: Optional[str] = None
+    unread: int
+    capped: bool = False  # unread reached CHAT_UNREAD_CAP; the real count may be higher
+
+class ReadReceiptOut(BaseModel):
+    user_id: str
+    last_read_id: str
@@ -1,4 +1,4 @@
-from typing import Optional, List, Literal
+from typing import Optional, Literal
 from pydantic import BaseModel, Field
 from enum import Enum
 import datetime
@@ -26,6 +26,7 @@ class TimelineEntry(BaseModel):
     user_role: str
     comment: Optional[str] = None
     status: Optional[TicketStatus] = None
+    number: Optional[int] = None  # 1-based position in the ticket's timeline
 
 class TicketCreate(BaseModel):
     client_id: str
@@ -50,4 +51,6 @@ class TicketOut(BaseModel):
     description: str
     status: TicketStatus
     solution: Optional[str] = None
-    timeline: Optional[List[TimelineEntry]] = None
+    # Full history: GET /tickets/{ticket_id}/timeline
+    last_entry: Optional[TimelineEntry] = None
+    timeline_count: int = 0
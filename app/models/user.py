@@ -38,6 +38,23 @@ class UserCreate(UserBase):
     passcode: str  # Required for creation
     
 
+class BulkUserCreate(BaseModel):
+    users: List[UserCreate] = Field(..., min_length=1, max_length=1000)
+
+class BulkUserResult(BaseModel):
+    index: int  # position in the submitted batch
+    email: str
+    user_id: Optional[str] = None
+    status: str  # "created" or "failed"
+    error: Optional[str] = None
+
+class BulkUserReport(BaseModel):
+    total: int
+    created: int
+    failed: int
+    results: List[BulkUserResult]
+
+
 class UserUpdate(BaseModel):
     first_name: Optional[str] = None
     last_name: Optional[str] = None
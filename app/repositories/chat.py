@@ -1,18 +1,168 @@
 # -------------------
 # 📁 repositories/chat_repository.py
 # -------------------
-from app.core.db import database  # assumed existing Mongo client wrapper
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.core.db import ThreadpoolRepository, async_database, database, use_motor
+from app.core.pagination import clamp_limit, decode_cursor, encode_cursor
+
+
+def _as_message(doc: dict) -> dict:
+    """Expose ``_id`` as the message id clients resume from (``since``)."""
+    doc["message_id"] = str(doc.pop("_id"))
+    return doc
+
+
+def _only_duplicates(exc: BulkWriteError) -> bool:
+    """A retried batch hitting messages that did reach Mongo the first time."""
+    errors = exc.details.get("writeErrors", [])
+    return bool(errors) and all(error.get("code") == 11000 for error in errors) and not exc.details.get("writeConcernErrors")
+
+
+def _watermark_updates(marks: list) -> list:
+    """$max upserts: a flush can never move a watermark backwards, whatever the order of workers."""
+    now = datetime.utcnow()
+    return [
+        UpdateOne(
+            {"project_id": project_id, "user_id": user_id},
+            {"$max": {"last_read_id": last_read_id}, "$set": {"updated_at": now}},
+            upsert=True,
+        )
+        for project_id, user_id, last_read_id in marks
+    ]
+
+
+def _unread_query(project_id: str, user_id: str, after_id: Optional[ObjectId]) -> dict:
+    query = {"project_id": project_id, "user_id": {"$ne": user_id}}
+    if after_id is not None:
+        query["_id"] = {"$gt": after_id}
+    return query
+
+
+def _forward_batch(docs: list, limit: int) -> dict:
+    """Oldest-first batch; one extra row tells whether more follow."""
+    return {"messages": [_as_message(doc) for doc in docs[:limit]], "has_more": len(docs) > limit}
+
+
+def _backward_page(docs: list, limit: int) -> dict:
+    """Newest-first rows -> chronological page plus a cursor to the older ones."""
+    page = docs[:limit]
+    next_cursor = encode_cursor(page[-1]["_id"]) if len(docs) > limit else None
+    return {"items": [_as_message(doc) for doc in reversed(page)], "next_cursor": next_cursor}
+
+
+def _before_query(project_id: str, cursor: Optional[str]) -> dict:
+    query = {"project_id": project_id}
+    if cursor:
+        query["_id"] = {"$lt": decode_cursor(cursor)}
+    return query
+
 
 class ChatRepository:
     def __init__(self):
         self.collection = database["chat_messages"]
+        self.watermarks = database["chat_read_watermarks"]
 
     def save(self, chat_data: dict):
         self.collection.insert_one(chat_data)
 
-    def get_history(self, project_id: str):
-        chat_history = list(self.collection.find({"project_id": project_id}).sort("timestamp", 1))
-    
-        for chat in chat_history:
-            chat.pop("_id", None)  # remove _id field entirely
-        return chat_history
\ No newline at end of file
+    def save_many(self, messages: list):
+        """Insert a batch; messages carry their _id, so a retry only skips what is stored."""
+        try:
+            self.collection.insert_many(messages, ordered=False)
+        except BulkWriteError as exc:
+            if not _only_duplicates(exc):
+                raise
+
+    def count_since(self, project_id: str, since_id: ObjectId, cap: int) -> int:
+        """Messages after ``since_id``, counting no further than ``cap``."""
+        return self.collection.count_documents({"project_id": project_id, "_id": {"$gt": since_id}}, limit=cap)
+
+    def get_since(self, project_id: str, since_id: ObjectId, limit: int = None) -> dict:
+        limit = clamp_limit(limit)
+        found = self.collection.find({"project_id": project_id, "_id": {"$gt": since_id}})
+        return _forward_batch(list(found.sort("_id", ASCENDING).limit(limit + 1)), limit)
+
+    def get_before(self, project_id: str, cursor: str = None, limit: int = None) -> dict:
+        """Latest messages without a cursor, otherwise the ones older than it."""
+        limit = clamp_limit(limit)
+        found = self.collection.find(_before_query(project_id, cursor))
+        return _backward_page(list(found.sort("_id", DESCENDING).limit(limit + 1)), limit)
+
+    def message_exists(self, project_id: str, message_id: ObjectId) -> bool:
+        return self.collection.count_documents({"_id": message_id, "project_id": project_id}, limit=1) > 0
+
+    def save_watermarks(self, marks: list):
+        self.watermarks.bulk_write(_watermark_updates(marks), ordered=False)
+
+    def get_watermark(self, project_id: str, user_id: str) -> Optional[ObjectId]:
+        doc = self.watermarks.find_one({"project_id": project_id, "user_id": user_id}, {"_id": 0, "last_read_id": 1})
+        return doc["last_read_id"] if doc else None
+
+    def get_watermarks(self, project_id: str) -> dict:
+        found = self.watermarks.find({"project_id": project_id}, {"_id": 0, "user_id": 1, "last_read_id": 1})
+        return {doc["user_id"]: doc["last_read_id"] for doc in found}
+
+    def count_unread(self, project_id: str, user_id: str, after_id: Optional[ObjectId], cap: int) -> int:
+        """Others' messages after the watermark, counting no further than ``cap``."""
+        return self.collection.count_documents(_unread_query(project_id, user_id, after_id), limit=cap)
+
+
+class AsyncChatRepository:
+    """Motor counterpart of ChatRepository; same methods, awaited."""
+
+    def __init__(self):
+        self.collection = async_database["chat_messages"]
+        self.watermarks = async_database["chat_read_watermarks"]
+
+    async def save(self, chat_data: dict):
+        await self.collection.insert_one(chat_data)
+
+    async def save_many(self, messages: list):
+        try:
+            await self.collection.insert_many(messages, ordered=False)
+        except BulkWriteError as exc:
+            if not _only_duplicates(exc):
+                raise
+
+    async def count_since(self, project_id: str, since_id: ObjectId, cap: int) -> int:
+        return await self.collection.count_documents({"project_id": project_id, "_id": {"$gt": since_id}}, limit=cap)
+
+    async def get_since(self, project_id: str, since_id: ObjectId, limit: int = None) -> dict:
+        limit = clamp_limit(limit)
+        found = self.collection.find({"project_id": project_id, "_id": {"$gt": since_id}})
+        return _forward_batch(await found.sort("_id", ASCENDING).limit(limit + 1).to_list(length=limit + 1), limit)
+
+    async def get_before(self, project_id: str, cursor: str = None, limit: int = None) -> dict:
+        limit = clamp_limit(limit)
+        found = self.collection.find(_before_query(project_id, cursor))
+        return _backward_page(await found.sort("_id", DESCENDING).limit(limit + 1).to_list(length=limit + 1), limit)
+
+    async def message_exists(self, project_id: str, message_id: ObjectId) -> bool:
+        return await self.collection.count_documents({"_id": message_id, "project_id": project_id}, limit=1) > 0
+
+    async def save_watermarks(self, marks: list):
+        await self.watermarks.bulk_write(_watermark_updates(marks), ordered=False)
+
+    async def get_watermark(self, project_id: str, user_id: str) -> Optional[ObjectId]:
+        doc = await self.watermarks.find_one({"project_id": project_id, "user_id": user_id}, {"_id": 0, "last_read_id": 1})
+        return doc["last_read_id"] if doc else None
+
+    async def get_watermarks(self, project_id: str) -> dict:
+        found = self.watermarks.find({"project_id": project_id}, {"_id": 0, "user_id": 1, "last_read_id": 1})
+        return {doc["user_id"]: doc["last_read_id"] async for doc in found}
+
+    async def count_unread(self, project_id: str, user_id: str, after_id: Optional[ObjectId], cap: int) -> int:
+        return await self.collection.count_documents(_unread_query(project_id, user_id, after_id), limit=cap)
+
+
+def chat_repository():
+    """Chat repository for async callers, per the DB_DRIVER switch."""
+    if use_motor():
+        return AsyncChatRepository()
+    return ThreadpoolRepository(ChatRepository())
@@ -1,9 +1,15 @@
 import uuid
 from typing import List, Optional
+from pymongo import ReturnDocument
 from pymongo.collection import Collection
 from fastapi import HTTPException
-from app.core.db import database
-from app.models.request import RequestStatus
+from app.core.pagination import fetch_page, fetch_page_async
+from app.core.projection import model_projection
+from app.core.db import ThreadpoolRepository, async_database, database, use_motor
+from app.models.request import RequestOut, RequestStatus
+
+REQUEST_PROJECTION = model_projection(RequestOut)
+
 
 class RequestRepository:
     def __init__(self):
@@ -26,25 +32,28 @@ class RequestRepository:
         if existing:
             raise HTTPException(400, "Request already exists and is pending.")
         self.collection.insert_one(doc)
+        doc.pop("_id", None)
         return doc
 
     def update_status(self, request_id: str, status: str, acting_user_id: str) -> Optional[dict]:
-        result = self.collection.update_one(
+        request = self.collection.find_one_and_update(
             {"request_id": request_id},
-            {"$set": {"status": status}}
+            {"$set": {"status": status}},
+            projection=REQUEST_PROJECTION,
+            return_document=ReturnDocument.AFTER,
         )
-        if result.matched_count == 0:
+        if request is None:
             raise HTTPException(404, "Request not found.")
-        return self.collection.find_one({"request_id": request_id}, {"_id": 0})
+        return request
 
-    def get_sent_requests(self, client_id: str) -> list:
-        return list(self.collection.find({"client_id": client_id}, {"_id": 0}))
+    def get_sent_requests(self, client_id: str, cursor: str = None, limit: int = None, projection: dict = None) -> dict:
+        return fetch_page(self.collection, {"client_id": client_id}, projection or REQUEST_PROJECTION, cursor, limit)
 
-    def get_received_requests(self, freelancer_id: str) -> list:
-        return list(self.collection.find({"freelancer_id": freelancer_id}, {"_id": 0}))
+    def get_received_requests(self, freelancer_id: str, cursor: str = None, limit: int = None, projection: dict = None) -> dict:
+        return fetch_page(self.collection, {"freelancer_id": freelancer_id}, projection or REQUEST_PROJECTION, cursor, limit)
 
     def get_request(self, request_id: str) -> Optional[dict]:
-        return self.collection.find_one({"request_id": request_id}, {"_id": 0})
+        return self.collection.find_one({"request_id": request_id}, REQUEST_PROJECTION)
     
     def request_exists(self, client_id: str, freelancer_id: str) -> bool:
         return self.collection.count_documents({
@@ -76,3 +85,77 @@ class RequestRepository:
         if data > 0:
             return True
         return False
+
+
+class AsyncRequestRepository:
+    """Motor counterpart of RequestRepository; same methods, awaited."""
+
+    def __init__(self):
+        self.collection = async_database["chat_requests"]
+
+    async def create_request(self, client_id: str, freelancer_id: str) -> dict:
+        request_id = str(uuid.uuid4())
+        doc = {
+            "request_id": request_id,
+            "client_id": client_id,
+            "freelancer_id": freelancer_id,
+            "status": RequestStatus.PENDING.value,
+        }
+        existing = await self.collection.find_one({
+            "client_id": client_id,
+            "freelancer_id": freelancer_id,
+            "status": RequestStatus.PENDING.value
+        })
+        if existing:
+            raise HTTPException(400, "Request already exists and is pending.")
+        await self.collection.insert_one(doc)
+        doc.pop("_id", None)
+        return doc
+
+    async def update_status(self, request_id: str, status: str, acting_user_id: str) -> Optional[dict]:
+        request = await self.collection.find_one_and_update(
+            {"request_id": request_id},
+            {"$set": {"status": status}},
+            projection=REQUEST_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+        if request is None:
+            raise HTTPException(404, "Request not found.")
+        return request
+
+    async def get_sent_requests(self, client_id: str, cursor: str = None, limit: int = None, projection: dict = None) -> dict:
+        return await fetch_page_async(self.collection, {"client_id": client_id}, projection or REQUEST_PROJECTION, cursor, limit)
+
+    async def get_received_requests(self, freelancer_id: str, cursor: str = None, limit: int = None, projection: dict = None) -> dict:
+        return await fetch_page_async(self.collection, {"freelancer_id": freelancer_id}, projection or REQUEST_PROJECTION, cursor, limit)
+
+    async def get_request(self, request_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"request_id": request_id}, REQUEST_PROJECTION)
+
+    async def request_exists(self, client_id: str, freelancer_id: str) -> bool:
+        return await self.collection.count_documents({
+            "client_id": client_id,
+            "freelancer_id": freelancer_id,
+            "status": RequestStatus.PENDING.value
+        }) > 0
+
+    async def delete_request(self, request_id: str, client_id: str):
+        result = await self.collection.delete_one({"request_id": request_id, "client_id": client_id})
+        if result.deleted_count == 0:
+            raise HTTPException(404, "Request not found or unauthorized.")
+
+    async def project_exists(self, project_id: str, status: str, client_id: str = None, freelancer_id: str = None) -> bool:
+        if client_id:
+            query = {"project_id": project_id, "client_id": client_id, "status": status}
+        elif freelancer_id:
+            query = {"project_id": project_id, "freelancer_id": freelancer_id, "status": status}
+        else:
+            return False
+        return await self.collection.count_documents(query, limit=1) > 0
+
+
+def request_repository():
+    """Request repository for async callers, per the DB_DRIVER switch."""
+    if use_motor():
+        return AsyncRequestRepository()
+    return ThreadpoolRepository(RequestRepository())
@@ -1,37 +1,306 @@
+import asyncio
+import inspect
+import os
+import time
 import uuid
 from typing import List, Optional
+from pymongo import ReturnDocument
 from pymongo.collection import Collection
+from pymongo.errors import DuplicateKeyError, PyMongoError
 from fastapi import HTTPException
-from app.core.db import database
-from app.models.ticket import TicketStatus, TimelineEntry, TimelineAction
+from app.core.audit_log import define_logger
+from app.core.config import config
+from app.core.pagination import clamp_limit, decode_position, encode_position, fetch_page, fetch_page_async
+from app.core.projection import model_projection
+from app.core.db import ThreadpoolRepository, async_database, database, use_motor
+from app.models.ticket import TicketOut, TicketStatus, TimelineEntry, TimelineAction
+
+TICKET_PROJECTION = model_projection(TicketOut)
+
+# Timeline entries live in ticket_timelines, BUCKET_SIZE per document keyed
+# by (ticket_id, seq); entry n (1-based) is in bucket (n - 1) // BUCKET_SIZE.
+# The ticket itself only keeps last_entry and timeline_count.
+BUCKET_SIZE = config["ticket_timeline_bucket_size"]
+# Bucket writes are retried with a growing pause before an entry is given up
+APPEND_ATTEMPTS = 3
+APPEND_BACKOFF = 0.2
+
+
+def timeline_bucket(number: int) -> int:
+    return (number - 1) // BUCKET_SIZE
+
+
+def _with_entry(update_data: dict, entry: dict) -> list:
+    """
+    Pipeline update applying ``update_data`` and recording ``entry`` as the
+    ticket's next timeline entry, numbered atomically with the update.
+    """
+    return [
+        {"$set": {
+            **{field: {"$literal": value} for field, value in update_data.items()},
+            # Tickets not migrated yet still count their embedded timeline
+            "timeline_count": {"$add": [
+                {"$ifNull": ["$timeline_count", {"$size": {"$ifNull": ["$timeline", []]}}]}, 1
+            ]},
+            "last_entry": {"$literal": entry},
+        }},
+        {"$set": {"last_entry.number": "$timeline_count"}},
+    ]
+
+
+def _bucket_query(ticket_id: str, entry: dict) -> dict:
+    # Only a bucket still missing the entry matches, so retries never duplicate it
+    return {"ticket_id": ticket_id, "seq": timeline_bucket(entry["number"]), "entries.number": {"$ne": entry["number"]}}
+
+
+def _bucket_push(entry: dict) -> dict:
+    # Concurrent appends may land out of order; keep each bucket sorted
+    return {"$push": {"entries": {"$each": [entry], "$sort": {"number": 1}}}}
+
+
+def _timeline_query(ticket_id: str, cursor: Optional[str], limit: Optional[int]):
+    after = decode_position(cursor) if cursor else 0
+    limit = clamp_limit(limit)
+    # Enough buckets for limit + 1 entries even if the first is mostly consumed
+    return after, limit, {"ticket_id": ticket_id, "seq": {"$gte": timeline_bucket(after + 1)}}, limit // BUCKET_SIZE + 2
+
+
+def _lost_last_entry(buckets: list, after: int, limit: int, last_entry: Optional[dict]) -> Optional[dict]:
+    """
+    The ticket's ``last_entry`` when this is the final page and the entry
+    never reached its bucket (the append failed after the ticket update).
+    """
+    if not last_entry or last_entry.get("number", 0) <= after:
+        return None
+    numbers = [entry["number"] for bucket in buckets for entry in bucket["entries"] if entry["number"] > after]
+    if len(numbers) > limit or last_entry["number"] in numbers:
+        return None
+    return last_entry
+
+
+def _timeline_page(buckets: list, after: int, limit: int, lost: dict = None) -> dict:
+    entries = [entry for bucket in buckets for entry in bucket["entries"] if entry["number"] > after]
+    if lost is not None:
+        # Highest number of the ticket, so it belongs at the end
+        entries.append(lost)
+    next_cursor = encode_position(entries[limit - 1]["number"]) if len(entries) > limit else None
+    return {"items": entries[:limit], "next_cursor": next_cursor}
+
+
+def _log_lost_entry(ticket_id: str, entry: dict, exc: Exception):
+    # The ticket still carries the entry as last_entry until the next one;
+    # get_timeline serves it from there and re-appends it meanwhile
+    define_logger(
+        level=40,
+        message=f"Timeline entry {entry.get('number')} of ticket {ticket_id} not stored: {exc}",
+        pid=os.getpid(),
+        loggName=inspect.stack()[0],
+    )
+
 
 class TicketRepository:
     def __init__(self):
         self.collection: Collection = database["tickets"]
+        self.timelines: Collection = database["ticket_timelines"]
 
-    def create_ticket(self, data: dict) -> dict:
+    def create_ticket(self, data: dict, entry: dict) -> dict:
         ticket_id = str(uuid.uuid4())
         data["ticket_id"] = ticket_id
+        data["last_entry"] = {**entry, "number": 1}
+        data["timeline_count"] = 1
         self.collection.insert_one(data)
-        return self.collection.find_one({"ticket_id": ticket_id}, {"_id": 0})
+        # insert_one adds _id to data; no need to read the ticket back
+        data.pop("_id", None)
+        self._append_entry(ticket_id, data["last_entry"])
+        return data
+
+    def _append_entry(self, ticket_id: str, entry: dict):
+        query = _bucket_query(ticket_id, entry)
+        for attempt in range(APPEND_ATTEMPTS):
+            try:
+                try:
+                    self.timelines.update_one(query, _bucket_push(entry), upsert=True)
+                except DuplicateKeyError:
+                    # The bucket exists: lost the race creating it, or it
+                    # already holds the entry and nothing matches
+                    self.timelines.update_one(query, _bucket_push(entry))
+                return
+            except PyMongoError as exc:
+                if attempt == APPEND_ATTEMPTS - 1:
+                    _log_lost_entry(ticket_id, entry, exc)
+                    return
+                time.sleep(APPEND_BACKOFF * (attempt + 1))
 
-    def update_ticket(self, ticket_id: str, update_data: dict):
-        result = self.collection.update_one({"ticket_id": ticket_id}, {"$set": update_data})
-        if result.matched_count == 0:
+    def update_ticket(self, ticket_id: str, update_data: dict, timeline_entry: dict = None):
+        """Apply the update (and timeline entry) and return the updated ticket in one round-trip."""
+        update = {"$set": update_data} if timeline_entry is None else _with_entry(update_data, timeline_entry)
+        ticket = self.collection.find_one_and_update(
+            {"ticket_id": ticket_id},
+            update,
+            projection=TICKET_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+        if ticket is None:
             raise HTTPException(404, "Ticket not found")
-        return self.collection.find_one({"ticket_id": ticket_id}, {"_id": 0})
+        if timeline_entry is not None:
+            self._append_entry(ticket_id, ticket["last_entry"])
+        return ticket
 
-    def add_timeline_entry(self, ticket_id: str, entry: dict):
-        self.collection.update_one(
+    def transition_ticket(
+        self,
+        ticket_id: str,
+        from_statuses: List[str],
+        update_data: dict,
+        timeline_entry: dict,
+        freelancer_id: str = None,
+    ) -> Optional[dict]:
+        """
+        Move the ticket to a new state only if it is currently in one of
+        ``from_statuses``. The state change and the entry's number/last_entry
+        are one atomic update; the entry is then appended to its bucket.
+        Returns the updated ticket, or None if nothing matched.
+        """
+        query = {"ticket_id": ticket_id, "status": {"$in": from_statuses}}
+        if freelancer_id is not None:
+            query["freelancer_id"] = freelancer_id
+        ticket = self.collection.find_one_and_update(
+            query,
+            _with_entry(update_data, timeline_entry),
+            projection=TICKET_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+        if ticket is not None:
+            self._append_entry(ticket_id, ticket["last_entry"])
+        return ticket
+
+    def get_timeline(self, ticket_id: str, cursor: str = None, limit: int = None, last_entry: dict = None) -> dict:
+        """
+        One page of the ticket's timeline, oldest first. ``last_entry`` (the
+        ticket's) fills in for a bucket write that failed, and is re-appended.
+        """
+        after, limit, query, buckets = _timeline_query(ticket_id, cursor, limit)
+        found = list(self.timelines.find(query, {"_id": 0, "entries": 1}).sort("seq", 1).limit(buckets))
+        lost = _lost_last_entry(found, after, limit, last_entry)
+        if lost is not None:
+            self._append_entry(ticket_id, lost)
+        return _timeline_page(found, after, limit, lost)
+
+    def get_ticket(self, ticket_id: str, projection: dict = None) -> Optional[dict]:
+        return self.collection.find_one({"ticket_id": ticket_id}, projection or TICKET_PROJECTION)
+
+    def get_tickets_by_freelancer(self, freelancer_id: str, cursor: str = None, limit: int = None, projection: dict = None) -> dict:
+        return fetch_page(
+            self.collection, {"freelancer_id": freelancer_id}, projection or TICKET_PROJECTION, cursor, limit
+        )
+
+    def get_all_tickets(self, cursor: str = None, limit: int = None, projection: dict = None) -> dict:
+        return fetch_page(self.collection, {}, projection or TICKET_PROJECTION, cursor, limit)
+
+
+class AsyncTicketRepository:
+    """Motor counterpart of TicketRepository; same methods, awaited."""
+
+    def __init__(self):
+        self.collection = async_database["tickets"]
+        self.timelines = async_database["ticket_timelines"]
+
+    async def create_ticket(self, data: dict, entry: dict) -> dict:
+        ticket_id = str(uuid.uuid4())
+        data["ticket_id"] = ticket_id
+        data["last_entry"] = {**entry, "number": 1}
+        data["timeline_count"] = 1
+        await self.collection.insert_one(data)
+        # insert_one adds _id to data; no need to read the ticket back
+        data.pop("_id", None)
+        await self._append_entry(ticket_id, data["last_entry"])
+        return data
+
+    async def _append_entry(self, ticket_id: str, entry: dict):
+        query = _bucket_query(ticket_id, entry)
+        for attempt in range(APPEND_ATTEMPTS):
+            try:
+                try:
+                    await self.timelines.update_one(query, _bucket_push(entry), upsert=True)
+                except DuplicateKeyError:
+                    # The bucket exists: lost the race creating it, or it
+                    # already holds the entry and nothing matches
+                    await self.timelines.update_one(query, _bucket_push(entry))
+                return
+            except PyMongoError as exc:
+                if attempt == APPEND_ATTEMPTS - 1:
+                    _log_lost_entry(ticket_id, entry, exc)
+                    return
+                await asyncio.sleep(APPEND_BACKOFF * (attempt + 1))
+
+    async def update_ticket(self, ticket_id: str, update_data: dict, timeline_entry: dict = None):
+        """Apply the update (and timeline entry) and return the updated ticket in one round-trip."""
+        update = {"$set": update_data} if timeline_entry is None else _with_entry(update_data, timeline_entry)
+        ticket = await self.collection.find_one_and_update(
             {"ticket_id": ticket_id},
-            {"$push": {"timeline": entry}}
+            update,
+            projection=TICKET_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+        if ticket is None:
+            raise HTTPException(404, "Ticket not found")
+        if timeline_entry is not None:
+            await self._append_entry(ticket_id, ticket["last_entry"])
+        return ticket
+
+    async def transition_ticket(
+        self,
+        ticket_id: str,
+        from_statuses: List[str],
+        update_data: dict,
+        timeline_entry: dict,
+        freelancer_id: str = None,
+    ) -> Optional[dict]:
+        """
+        Move the ticket to a new state only if it is currently in one of
+        ``from_statuses``. The state change and the entry's number/last_entry
+        are one atomic update; the entry is then appended to its bucket.
+        Returns the updated ticket, or None if nothing matched.
+        """
+        query = {"ticket_id": ticket_id, "status": {"$in": from_statuses}}
+        if freelancer_id is not None:
+            query["freelancer_id"] = freelancer_id
+        ticket = await self.collection.find_one_and_update(
+            query,
+            _with_entry(update_data, timeline_entry),
+            projection=TICKET_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+        if ticket is not None:
+            await self._append_entry(ticket_id, ticket["last_entry"])
+        return ticket
+
+    async def get_timeline(self, ticket_id: str, cursor: str = None, limit: int = None, last_entry: dict = None) -> dict:
+        """
+        One page of the ticket's timeline, oldest first. ``last_entry`` (the
+        ticket's) fills in for a bucket write that failed, and is re-appended.
+        """
+        after, limit, query, buckets = _timeline_query(ticket_id, cursor, limit)
+        found = self.timelines.find(query, {"_id": 0, "entries": 1}).sort("seq", 1).limit(buckets)
+        found = await found.to_list(length=buckets)
+        lost = _lost_last_entry(found, after, limit, last_entry)
+        if lost is not None:
+            await self._append_entry(ticket_id, lost)
+        return _timeline_page(found, after, limit, lost)
+
+    async def get_ticket(self, ticket_id: str, projection: dict = None) -> Optional[dict]:
+        return await self.collection.find_one({"ticket_id": ticket_id}, projection or TICKET_PROJECTION)
+
+    async def get_tickets_by_freelancer(self, freelancer_id: str, cursor: str = None, limit: int = None, projection: dict = None) -> dict:
+        return await fetch_page_async(
+            self.collection, {"freelancer_id": freelancer_id}, projection or TICKET_PROJECTION, cursor, limit
         )
 
-    def get_ticket(self, ticket_id: str) -> Optional[dict]:
-        return self.collection.find_one({"ticket_id": ticket_id}, {"_id": 0})
+    async def get_all_tickets(self, cursor: str = None, limit: int = None, projection: dict = None) -> dict:
+        return await fetch_page_async(self.collection, {}, projection or TICKET_PROJECTION, cursor, limit)
 
-    def get_tickets_by_freelancer(self, freelancer_id: str) -> List[dict]:
-        return list(self.collection.find({"freelancer_id": freelancer_id}, {"_id": 0, "timeline": 0}))
 
-    def get_all_tickets(self) -> List[dict]:
-        return list(self.collection.find({}, {"_id": 0}))
+def ticket_repository():
+    """Ticket repository for async callers, per the DB_DRIVER switch."""
+    if use_motor():
+        return AsyncTicketRepository()
+    return ThreadpoolRepository(TicketRepository())
@@ -1,10 +1,61 @@
-from typing import Optional
+from datetime import datetime
+from typing import List, Optional
+from pymongo import ReturnDocument
 from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from fastapi import HTTPException
 from app.models.user import UserBase, UserCreate, UserUpdate, UserOut
-from app.core.db import database
+from app.core.cache import TTLCache
+from app.core.config import config
+from app.core.indexes import EMAIL_COLLATION
+from app.core.pagination import fetch_page, fetch_page_async
+from app.core.projection import model_projection
+from app.core.db import ThreadpoolRepository, async_database, database, use_motor
+from app.core.request_context import request_memo
 import uuid
 
+# Active user documents keyed by user_id, shared by get_current_user and the
+# repository. Writes through UserRepository invalidate the entry; the TTL
+# bounds staleness for writes made by other workers.
+user_cache = TTLCache(maxsize=config["user_cache_size"], ttl=config["user_cache_ttl"])
+
+
+def cached_user(user_id: str) -> Optional[dict]:
+    """Return the user from the request memo or the process cache, without I/O."""
+    memo = request_memo("user")
+    if memo is not None and user_id in memo:
+        return dict(memo[user_id])
+    user = user_cache.get(user_id)
+    if user is not None:
+        if memo is not None:
+            memo[user_id] = user
+        return dict(user)
+    return None
+
+
+def remember_user(user_id: str, user: dict):
+    """Store a freshly read active user in the process cache and request memo."""
+    user_cache.set(user_id, user)
+    memo = request_memo("user")
+    if memo is not None:
+        memo[user_id] = user
+
+
+def forget_user(user_id: str):
+    """Invalidate a user everywhere in this process after a write."""
+    user_cache.invalidate(user_id)
+    memo = request_memo("user")
+    if memo is not None:
+        memo.pop(user_id, None)
+
+
+PENDING = "PENDING"
+
+# What user reads return (and the cache holds): the UserOut fields only, so
+# payment details, profile pictures etc. stay in Mongo.
+USER_PROJECTION = model_projection(UserOut)
+
+
 class UserRepository:
     def __init__(self):
         self.collection: Collection = database["user"]
@@ -15,31 +66,119 @@ class UserRepository:
         user_dict = user_data.model_dump()
         user_dict.pop("passcode", None)
         
-        result = self.collection.insert_one(user_dict)
-        return self.collection.find_one({"_id": result.inserted_id}, {"_id": 0})
+        self.collection.insert_one(user_dict)
+        user_dict.pop("_id", None)
+        return user_dict
+
+    def find_conflict(self, email: str, username: str) -> Optional[str]:
+        """Cheap pre-check: name the field (email/username) already taken, if any."""
+        existing = self.collection.find_one(
+            {"$or": [{"email": email}, {"username": username}]},
+            {"_id": 0, "email": 1, "username": 1},
+            collation=EMAIL_COLLATION,
+        )
+        if not existing:
+            return None
+        return "email" if existing.get("email", "").lower() == email.lower() else "username"
+
+    def reserve_user(self, user_data: UserCreate) -> dict:
+        """
+        First step of the signup saga: insert the user as PENDING so the
+        unique indexes claim its email/username before Keycloak is called.
+        """
+        user_dict = user_data.model_dump()
+        user_dict.pop("passcode", None)
+        user_dict["status"] = PENDING
+        user_dict["reserved_at"] = datetime.utcnow()
+        try:
+            self.collection.insert_one(user_dict)
+        except DuplicateKeyError as exc:
+            field = next(iter((exc.details or {}).get("keyPattern", {})), "user")
+            raise HTTPException(409, f"A user with this {field} already exists") from exc
+        user_dict.pop("_id", None)
+        return user_dict
+
+    def confirm_user(self, user_id: str, keycloak_id: str, status: str = "ACTIVE") -> Optional[dict]:
+        """Final step of the signup saga: activate the reservation."""
+        return self.collection.find_one_and_update(
+            {"user_id": user_id, "status": PENDING},
+            {"$set": {"status": status, "keycloak_id": keycloak_id}, "$unset": {"reserved_at": ""}},
+            projection=USER_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def release_users(self, user_ids: List[str]) -> int:
+        """Roll back reservations that never got confirmed."""
+        if not user_ids:
+            return 0
+        result = self.collection.delete_many({"user_id": {"$in": user_ids}, "status": PENDING})
+        return result.deleted_count
+
+    def get_stale_reservations(self, reserved_before: datetime, limit: int) -> List[dict]:
+        return list(
+            self.collection.find(
+                {"status": PENDING, "reserved_at": {"$lt": reserved_before}},
+                {"_id": 0, "user_id": 1, "keycloak_id": 1},
+            ).limit(limit)
+        )
+
+    def create_users(self, users: List[UserCreate]) -> dict:
+        """Insert many users with one insert_many; returns {index: error} for rejected ones."""
+        docs = []
+        for user in users:
+            user_dict = user.model_dump()
+            user_dict.pop("passcode", None)
+            docs.append(user_dict)
+        if not docs:
+            return {}
+        try:
+            self.collection.insert_many(docs, ordered=False)
+        except BulkWriteError as exc:
+            return {
+                error["index"]: error.get("errmsg", "write failed")
+                for error in exc.details.get("writeErrors", [])
+            }
+        return {}
+
+    def find_root_user(self, email: str, role: str) -> Optional[dict]:
+        return self.collection.find_one({"$or": [{"email": email}, {"role": role}]}, {"_id": 0})
 
     def get_user_by_id(self, user_id: str) -> Optional[dict]:
-        print("Fetching user by ID:", user_id)
-        user = self.collection.find_one({"user_id": user_id, "status": "ACTIVE"}, {"_id": 0})
+        user = cached_user(user_id)
+        if user is not None:
+            return user
+        user = self.collection.find_one({"user_id": user_id, "status": "ACTIVE"}, USER_PROJECTION)
         if not user:
             raise HTTPException(404, "User not found")
-        return user
+        remember_user(user_id, user)
+        return dict(user)
     
-    def get_freelancers(self) -> list[dict]:
-        freelancers = self.collection.find({"role": "FL", "status": "ACTIVE"}, {"_id": 0})
-        return list(freelancers)
+    def get_freelancers(self, cursor: str = None, limit: int = None, projection: dict = None) -> dict:
+        return fetch_page(
+            self.collection, {"role": "FL", "status": "ACTIVE"}, projection or USER_PROJECTION, cursor, limit
+        )
 
     def update_user(self, user_id: str, user_data: UserUpdate) -> Optional[dict]:
         if not user_data:
             raise HTTPException(400, "No data to update")
-        self.collection.update_one({"user_id": user_id}, {"$set": user_data})
-        return self.get_user_by_id(user_id)
+        user = self.collection.find_one_and_update(
+            {"user_id": user_id, "status": "ACTIVE"},
+            {"$set": user_data},
+            projection=USER_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+        forget_user(user_id)
+        if not user:
+            raise HTTPException(404, "User not found")
+        remember_user(user_id, user)
+        return dict(user)
 
     def ban_user(self, user_id: str) -> dict:
         result = self.collection.update_one(
             {"user_id": user_id},
             {"$set": {"status": "BANNED"}}
         )
+        forget_user(user_id)
         if result.matched_count == 0:
             raise HTTPException(404, "User not found.")
         return None
@@ -49,6 +188,143 @@ class UserRepository:
             {"user_id": user_id},
             {"$set": {"status": "DELETED"}}
         )
+        forget_user(user_id)
+        if result.matched_count == 0:
+            raise HTTPException(404, "User not found.")
+        return None
+
+
+class AsyncUserRepository:
+    """Motor counterpart of UserRepository; same methods, awaited."""
+
+    def __init__(self):
+        self.collection = async_database["user"]
+
+    async def create_user(self, user_data: UserCreate) -> Optional[dict]:
+        user_dict = user_data.model_dump()
+        user_dict.pop("passcode", None)
+
+        await self.collection.insert_one(user_dict)
+        user_dict.pop("_id", None)
+        return user_dict
+
+    async def find_conflict(self, email: str, username: str) -> Optional[str]:
+        existing = await self.collection.find_one(
+            {"$or": [{"email": email}, {"username": username}]},
+            {"_id": 0, "email": 1, "username": 1},
+            collation=EMAIL_COLLATION,
+        )
+        if not existing:
+            return None
+        return "email" if existing.get("email", "").lower() == email.lower() else "username"
+
+    async def reserve_user(self, user_data: UserCreate) -> dict:
+        user_dict = user_data.model_dump()
+        user_dict.pop("passcode", None)
+        user_dict["status"] = PENDING
+        user_dict["reserved_at"] = datetime.utcnow()
+        try:
+            await self.collection.insert_one(user_dict)
+        except DuplicateKeyError as exc:
+            field = next(iter((exc.details or {}).get("keyPattern", {})), "user")
+            raise HTTPException(409, f"A user with this {field} already exists") from exc
+        user_dict.pop("_id", None)
+        return user_dict
+
+    async def confirm_user(self, user_id: str, keycloak_id: str, status: str = "ACTIVE") -> Optional[dict]:
+        return await self.collection.find_one_and_update(
+            {"user_id": user_id, "status": PENDING},
+            {"$set": {"status": status, "keycloak_id": keycloak_id}, "$unset": {"reserved_at": ""}},
+            projection=USER_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def release_users(self, user_ids: List[str]) -> int:
+        if not user_ids:
+            return 0
+        result = await self.collection.delete_many({"user_id": {"$in": user_ids}, "status": PENDING})
+        return result.deleted_count
+
+    async def get_stale_reservations(self, reserved_before: datetime, limit: int) -> List[dict]:
+        cursor = self.collection.find(
+            {"status": PENDING, "reserved_at": {"$lt": reserved_before}},
+            {"_id": 0, "user_id": 1, "keycloak_id": 1},
+        )
+        return await cursor.to_list(length=limit)
+
+    async def create_users(self, users: List[UserCreate]) -> dict:
+        docs = []
+        for user in users:
+            user_dict = user.model_dump()
+            user_dict.pop("passcode", None)
+            docs.append(user_dict)
+        if not docs:
+            return {}
+        try:
+            await self.collection.insert_many(docs, ordered=False)
+        except BulkWriteError as exc:
+            return {
+                error["index"]: error.get("errmsg", "write failed")
+                for error in exc.details.get("writeErrors", [])
+            }
+        return {}
+
+    async def find_root_user(self, email: str, role: str) -> Optional[dict]:
+        return await self.collection.find_one({"$or": [{"email": email}, {"role": role}]}, {"_id": 0})
+
+    async def get_user_by_id(self, user_id: str) -> Optional[dict]:
+        user = cached_user(user_id)
+        if user is not None:
+            return user
+        user = await self.collection.find_one({"user_id": user_id, "status": "ACTIVE"}, USER_PROJECTION)
+        if not user:
+            raise HTTPException(404, "User not found")
+        remember_user(user_id, user)
+        return dict(user)
+
+    async def get_freelancers(self, cursor: str = None, limit: int = None, projection: dict = None) -> dict:
+        return await fetch_page_async(
+            self.collection, {"role": "FL", "status": "ACTIVE"}, projection or USER_PROJECTION, cursor, limit
+        )
+
+    async def update_user(self, user_id: str, user_data: UserUpdate) -> Optional[dict]:
+        if not user_data:
+            raise HTTPException(400, "No data to update")
+        user = await self.collection.find_one_and_update(
+            {"user_id": user_id, "status": "ACTIVE"},
+            {"$set": user_data},
+            projection=USER_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+        forget_user(user_id)
+        if not user:
+            raise HTTPException(404, "User not found")
+        remember_user(user_id, user)
+        return dict(user)
+
+    async def ban_user(self, user_id: str) -> dict:
+        result = await self.collection.update_one(
+            {"user_id": user_id},
+            {"$set": {"status": "BANNED"}}
+        )
+        forget_user(user_id)
+        if result.matched_count == 0:
+            raise HTTPException(404, "User not found.")
+        return None
+
+    async def delete_user(self, user_id: str) -> dict:
+        result = await self.collection.update_one(
+            {"user_id": user_id},
+            {"$set": {"status": "DELETED"}}
+        )
+        forget_user(user_id)
         if result.matched_count == 0:
             raise HTTPException(404, "User not found.")
         return None
+
+
+def user_repository():
+    """User repository for async callers, per the DB_DRIVER switch."""
+    if use_motor():
+        return AsyncUserRepository()
+    return ThreadpoolRepository(UserRepository())
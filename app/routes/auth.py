@@ -1,11 +1,13 @@
 # app/routers/auth.py
 import logging
+from typing import Any, Dict
 from fastapi import APIRouter, Depends
 from starlette import status
 from app.models.user import UserCreate, UserUpdate, UserOut, TokenResponse, LoginRequest, RefreshRequest
 from app.services.user import UserService
 from app.schemas.response import APIResponse, ok
 from app.core.exceptions import Forbidden
+from app.core.keycloak_async import get_current_user
 
 logger = logging.getLogger(__name__)
 
@@ -15,34 +17,41 @@ def get_user_service() -> UserService:
     return UserService()
 
 @router.post("/signup", response_model=APIResponse[UserOut], status_code=status.HTTP_201_CREATED)
-def create_user(user: UserCreate, svc: UserService = Depends(get_user_service)):
+async def create_user(user: UserCreate, svc: UserService = Depends(get_user_service)):
     logger.debug(f"Signup request received: {user.model_dump()}")
     if getattr(user, "role", None) == "SA":
         logger.warning("Attempt to create Super Admin user blocked.")
         raise Forbidden("Cannot create super admin users.")
-    created: UserOut = svc.create_user(user)
+    created: UserOut = await svc.create_user(user)
     logger.info(f"User created successfully: {created.id}")
     return ok(data=created, message="User created", status_code=status.HTTP_201_CREATED)
 
 @router.post("/login", response_model=APIResponse[TokenResponse], status_code=status.HTTP_200_OK)
-def login(payload: LoginRequest, svc: UserService = Depends(get_user_service)):
+async def login(payload: LoginRequest, svc: UserService = Depends(get_user_service)):
     logger.debug(f"Login attempt for email: {payload.email}")
-    tokens_dict = svc.user_login(payload)
+    tokens_dict = await svc.user_login(payload)
     tokens = TokenResponse(**tokens_dict)
     logger.info(f"Login successful for email: {payload.email}")
     return ok(data=tokens, message="Login successful")
 
 @router.post("/refresh", response_model=APIResponse[TokenResponse], status_code=status.HTTP_200_OK)
-def refresh_token(payload: RefreshRequest, svc: UserService = Depends(get_user_service)):
+async def refresh_token(payload: RefreshRequest, svc: UserService = Depends(get_user_service)):
     logger.debug("Token refresh requested")
-    tokens_dict = svc.user_refresh(payload)
+    tokens_dict = await svc.user_refresh(payload)
     tokens = TokenResponse(**tokens_dict)
     logger.info("Token refreshed successfully")
     return ok(data=tokens, message="Token refreshed")
 
+@router.post("/logout", response_model=APIResponse[None], status_code=status.HTTP_200_OK)
+async def logout(current_user: Dict[str, Any] = Depends(get_current_user), svc: UserService = Depends(get_user_service)):
+    logger.debug(f"Logout requested by user_id={current_user.get('user_id')}")
+    await svc.user_logout(current_user)
+    logger.info(f"Session revoked for user_id={current_user.get('user_id')}")
+    return ok(data=None, message="Logged out")
+
 @router.put("/me", response_model=APIResponse[UserOut], status_code=status.HTTP_200_OK)
-def update_me(update: UserUpdate, svc: UserService = Depends(get_user_service)):
+async def update_me(update: UserUpdate, svc: UserService = Depends(get_user_service)):
     logger.debug(f"Update profile request: {update.model_dump(exclude_unset=True)}")
-    updated: UserOut = svc.update_current_user(update)
+    updated: UserOut = await svc.update_current_user(update)
     logger.info(f"Profile updated for user: {updated.id}")
     return ok(data=updated, message="Profile updated")
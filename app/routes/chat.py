@@ -1,14 +1,21 @@
 # -------------------
 # 📁 router/chat_router.py
 # -------------------
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+import json
+import logging
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from app.models.chat import ChatMessageOut, ReadReceiptOut, UnreadOut
 from app.services.chat import ChatService, WebSocketManager
-from datetime import datetime
 from app.services.user import UserService
-from app.core.keycloak import decode_token
+from app.core.config import config
+from app.core.keycloak_async import decode_token, get_current_user
+from app.core.pagination import PageParams
 from app.services.request import RequestService
+from app.schemas.response import APIResponse, Page, ok
 from starlette import status
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
 chat_service = ChatService()
@@ -67,35 +74,154 @@ websocket_manager = WebSocketManager()
 #         await websocket_manager.disconnect(user_id, project_id)
 
 
+@router.get("/chat/{project_id}/messages", response_model=APIResponse[Page[ChatMessageOut]], tags=["CHAT"])
+async def get_messages(project_id: str, page: PageParams = Depends(), user: Dict[str, Any] = Depends(get_current_user)):
+    logger.debug(f"Get messages: project_id={project_id} by user_id={user.get('user_id')} cursor={page.cursor}")
+    if not await RequestService().project_exists(project_id, user["user_id"], user["role"]):
+        logger.warning(f"Message history denied: project_id={project_id} user_id={user.get('user_id')}")
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Not a member of this project")
+    messages = await chat_service.get_messages(project_id, page.cursor, page.limit)
+    logger.info(f"Messages fetched: project_id={project_id} count={len(messages['items'])}")
+    return ok(data=messages, message="Messages fetched")
+
+@router.get("/chat/{project_id}/online", response_model=APIResponse[List[str]], tags=["CHAT"])
+async def get_online(project_id: str, user: Dict[str, Any] = Depends(get_current_user)):
+    logger.debug(f"Get online members: project_id={project_id} by user_id={user.get('user_id')}")
+    if not await RequestService().project_exists(project_id, user["user_id"], user["role"]):
+        logger.warning(f"Online members denied: project_id={project_id} user_id={user.get('user_id')}")
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Not a member of this project")
+    # Members connected to this worker
+    online = websocket_manager.online_users(project_id)
+    logger.info(f"Online members fetched: project_id={project_id} count={len(online)}")
+    return ok(data=online, message="Online members fetched")
+
+@router.get("/chat/{project_id}/unread", response_model=APIResponse[UnreadOut], tags=["CHAT"])
+async def get_unread(project_id: str, user: Dict[str, Any] = Depends(get_current_user)):
+    logger.debug(f"Get unread count: project_id={project_id} by user_id={user.get('user_id')}")
+    if not await RequestService().project_exists(project_id, user["user_id"], user["role"]):
+        logger.warning(f"Unread count denied: project_id={project_id} user_id={user.get('user_id')}")
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Not a member of this project")
+    unread = await chat_service.get_unread(project_id, user["user_id"])
+    logger.info(f"Unread count fetched: project_id={project_id} unread={unread['unread']}")
+    return ok(data=unread, message="Unread count fetched")
+
+@router.get("/chat/{project_id}/receipts", response_model=APIResponse[List[ReadReceiptOut]], tags=["CHAT"])
+async def get_receipts(project_id: str, user: Dict[str, Any] = Depends(get_current_user)):
+    logger.debug(f"Get read receipts: project_id={project_id} by user_id={user.get('user_id')}")
+    if not await RequestService().project_exists(project_id, user["user_id"], user["role"]):
+        logger.warning(f"Read receipts denied: project_id={project_id} user_id={user.get('user_id')}")
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Not a member of this project")
+    receipts = await chat_service.get_receipts(project_id)
+    logger.info(f"Read receipts fetched: project_id={project_id} count={len(receipts)}")
+    return ok(data=receipts, message="Read receipts fetched")
+
+async def join_project(connection, user: dict, project_id: str) -> bool:
+    """Subscribe the socket to a project the user belongs to."""
+    if not project_id or not await RequestService().project_exists(project_id, user["user_id"], user["role"]):
+        return False
+    websocket_manager.subscribe(connection, project_id)
+    return True
+
 @router.websocket("/ws/{project_id}/{user_id}")
-async def ws(project_id: str, user_id: str, websocket: WebSocket):
+async def ws(project_id: str, user_id: str, websocket: WebSocket, since: Optional[str] = Query(None), limit: int = Query(config["chat_history_page_size"], ge=1, le=config["page_size_max"])):
+    await serve_socket(websocket, user_id, project_id, since, limit)
+
+@router.websocket("/ws/{user_id}")
+async def ws_user(user_id: str, websocket: WebSocket, limit: int = Query(config["chat_history_page_size"], ge=1, le=config["page_size_max"])):
+    # Projects are joined with {"type": "subscribe", "project_id": ..., "since": ...} frames
+    await serve_socket(websocket, user_id, None, None, limit)
+
+async def serve_socket(websocket: WebSocket, user_id: str, project_id: Optional[str], since: Optional[str], limit: int):
+    """
+    One socket, any number of projects. Client frames:
+    {"type": "subscribe", "project_id", "since"?}, {"type": "unsubscribe", "project_id"},
+    {"type": "read", "project_id"?, "message_id"} (read receipt), {"type": "pong"}
+    (answer to the server's pings) and {"content", "project_id"?}; project_id
+    defaults to the project in the URL.
+    """
     # If you use a token, validate BEFORE or right after accept(), and close explicitly.
     await websocket.accept()
+    connection = None
     try:
-        user = UserService().get_user(user_id)  # must NOT raise HTTPException
+        user = await UserService().get_user(user_id)  # must NOT raise HTTPException
         if not user:
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION); return
 
-        # Send history safely (avoid raw ObjectId)
-        for chat in chat_service.get_chat_history(project_id):
-            chat.pop("_id", None)
-            await websocket.send_json(chat)
+        # Register first so nothing broadcast during the history replay is lost;
+        # those frames wait in the send queue until delivery starts
+        connection = await websocket_manager.connect(user_id, websocket)
+        if connection is None:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION); return
+        if project_id:
+            if not await join_project(connection, user, project_id):
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION); return
+
+            # History in batched frames; ?since=<message_id> resumes after the last message seen
+            # (reaching back a little, so the client dedupes by message_id)
+            try:
+                async for frame in chat_service.history_frames(project_id, since, limit):
+                    await websocket.send_json(frame)
+            except ValueError as e:
+                await websocket.send_json({"error": str(e)})
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION); return
+        websocket_manager.start_delivery(connection)
 
         # Main loop
         while True:
-            msg = await websocket.receive_json()  # may raise if bad JSON
+            text = await websocket.receive_text()
+            problem = websocket_manager.inbound(connection, text)
+            if problem == "too_big":
+                await websocket.close(code=status.WS_1009_MESSAGE_TOO_BIG); return
+            if problem == "rate_limited":
+                await websocket_manager.reply(connection, {"error": "Too many messages, slow down"}); continue
+            try:
+                msg = json.loads(text)
+            except ValueError:
+                msg = None
+            if not isinstance(msg, dict):
+                await websocket_manager.reply(connection, {"error": "Frames must be JSON objects"}); continue
+            kind = msg.get("type", "message")
+            target = msg.get("project_id") or project_id
+
+            if kind == "pong":
+                continue
+            if kind == "ping":
+                await websocket_manager.reply(connection, {"type": "pong"}); continue
+
+            if kind == "subscribe":
+                if not await join_project(connection, user, target):
+                    await websocket_manager.reply(connection, {"error": "Project not found", "project_id": target}); continue
+                try:
+                    # Live frames of the project may arrive before its history; order by message_id
+                    async for frame in chat_service.history_frames(target, msg.get("since"), limit):
+                        await websocket_manager.reply(connection, frame)
+                except ValueError as e:
+                    websocket_manager.unsubscribe(connection, target)
+                    await websocket_manager.reply(connection, {"error": str(e), "project_id": target}); continue
+                await websocket_manager.reply(connection, {"type": "subscribed", "project_id": target}); continue
+
+            if kind == "unsubscribe":
+                websocket_manager.unsubscribe(connection, target)
+                await websocket_manager.reply(connection, {"type": "unsubscribed", "project_id": target}); continue
+
+            if target not in connection.projects:
+                await websocket_manager.reply(connection, {"error": "Not subscribed to this project", "project_id": target}); continue
+
+            if kind == "read":
+                try:
+                    advanced = await chat_service.mark_read(target, user_id, msg.get("message_id"))
+                except ValueError as e:
+                    await websocket_manager.reply(connection, {"error": str(e), "project_id": target}); continue
+                if advanced:
+                    await websocket_manager.send_to_group(target, {"type": "read", "project_id": target, "user_id": user_id, "message_id": msg["message_id"]})
+                continue
+
             content = (msg.get("content") or "").strip()
             if not content:
-                await websocket.send_json({"error": "Message cannot be empty"}); continue
-
-            chat_service.log_chat(project_id, user_id, content, user["role"], user.get("name", ""))
-            await websocket_manager.send_to_group(project_id, {
-                "user_id": user_id,
-                "message": content,
-                "role": user["role"],
-                "user_name": user.get("name", ""),
-                "timestamp": datetime.utcnow().isoformat()
-            })
+                await websocket_manager.reply(connection, {"error": "Message cannot be empty"}); continue
+
+            entry = await chat_service.log_chat(target, user_id, content, user["role"], user.get("name", ""))
+            await websocket_manager.send_to_group(target, {"type": "message", **entry})
     except WebSocketDisconnect:
         pass
     except Exception as e:
@@ -106,4 +232,5 @@ async def ws(project_id: str, user_id: str, websocket: WebSocket):
         except Exception:
             pass
     finally:
-        await websocket_manager.disconnect(user_id, project_id)
\ No newline at end of file
+        if connection is not None:
+            await websocket_manager.disconnect(connection)
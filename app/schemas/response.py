@@ -1,5 +1,5 @@
 # app/schemas/response.py
-from typing import Generic, Optional, TypeVar
+from typing import Generic, List, Optional, TypeVar
 from pydantic import BaseModel
 
 T = TypeVar("T")
@@ -11,3 +11,7 @@ class APIResponse(BaseModel, Generic[T]):
 
 def ok(data: Optional[T] = None, message: str = "OK", status_code: int = 200) -> APIResponse[T]:
     return APIResponse[T](status_code=status_code, message=message, data=data)
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= for the next page; None on the last page
@@ -1,15 +1,56 @@
 # -------------------
 # 📁 services/chat_service.py
 # -------------------
-from app.repositories.chat import ChatRepository
-from datetime import datetime
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from starlette import status
+
+from app.core.broker import ChatBroker, chat_broker
+from app.core.config import config
+from app.core.pagination import clamp_limit, encode_cursor
+from app.core.read_watermarks import ReadWatermarks
+from app.core.recent_messages import RecentMessages
+from app.core.write_behind import WriteBehindQueue
+from app.repositories.chat import chat_repository
+from datetime import datetime, timedelta
+
+# Chat inserts are batched off the websocket loop; started/closed by app.main
+chat_writer = WriteBehindQueue(
+    chat_repository().save_many,
+    name="chat_messages",
+    max_batch=config["chat_write_batch_size"],
+    flush_interval=config["chat_write_flush_interval"],
+    max_pending=config["chat_write_queue_size"],
+    retries=config["chat_write_retries"],
+)
+
+# Latest messages of active projects, so most (re)connects skip Mongo
+recent_messages = RecentMessages(
+    per_project=config["chat_recent_per_project"],
+    max_bytes=config["chat_recent_max_mb"] * 1024 * 1024,
+)
+
+# Read receipts, flushed in bulk by a background task started in app.main
+read_watermarks = ReadWatermarks(
+    chat_repository().save_watermarks,
+    flush_interval=config["chat_read_flush_interval"],
+)
 
 class ChatService:
-    def __init__(self):
-        self.repo = ChatRepository()
+    def __init__(self, writer: WriteBehindQueue = None, recent: RecentMessages = None, watermarks: ReadWatermarks = None):
+        self.repo = chat_repository()
+        self.writer = writer or chat_writer
+        self.recent = recent or recent_messages
+        self.watermarks = watermarks or read_watermarks
 
-    def log_chat(self, project_id, user_id, message, role, user_name):
+    async def log_chat(self, project_id, user_id, message, role, user_name) -> dict:
         chat_entry = {
+            "_id": ObjectId(),
             "project_id": project_id,
             "user_id": user_id,
             "message": message,
@@ -17,27 +58,423 @@ class ChatService:
             "user_name": user_name,
             "timestamp": datetime.utcnow().isoformat()
         }
-        self.repo.save(chat_entry)
+        # _id is assigned here so the message can be broadcast (and resumed
+        # from) before the batch holding it is flushed
+        await self.writer.put(chat_entry)
+        self.recent.append(project_id, chat_entry)
+        entry = {key: value for key, value in chat_entry.items() if key != "_id"}
+        entry["message_id"] = str(chat_entry["_id"])
+        return entry
+
+    async def history_frames(self, project_id: str, since: Optional[str] = None, limit: int = None) -> AsyncIterator[dict]:
+        """
+        History for a (re)connecting socket, as ``{"type": "history"}`` frames
+        of up to ``limit`` messages. With ``since`` (the last message_id the
+        client saw) the messages from ``chat_resume_overlap`` seconds before
+        it on are replayed, oldest first: ids from other workers within the
+        same second may sort below ``since``, so clients drop the message_ids
+        they already hold. Without it, or when more than
+        ``chat_history_replay_max`` were missed, one
+        frame with the latest page is sent (``reset`` tells a resuming client
+        to drop its view) and ``before`` pages further back over REST.
+        Served from the recent-message buffer when it covers the request.
+        """
+        limit = clamp_limit(limit or config["chat_history_page_size"])
+        await self._warm(project_id)
+        if since:
+            try:
+                since_id = ObjectId(since)
+            except (InvalidId, TypeError):
+                raise ValueError("Invalid since")
+            since_id = ObjectId.from_datetime(
+                since_id.generation_time - timedelta(seconds=config["chat_resume_overlap"])
+            )
+            missed = self.recent.since(project_id, since_id)
+            if missed is not None:
+                for start in range(0, max(len(missed), 1), limit):
+                    batch = missed[start:start + limit]
+                    yield {"type": "history", "project_id": project_id, "messages": batch, "has_more": start + limit < len(missed)}
+                return
+            cap = config["chat_history_replay_max"]
+            if await self.repo.count_since(project_id, since_id, cap + 1) <= cap:
+                while True:
+                    batch = await self.repo.get_since(project_id, since_id, limit)
+                    yield {"type": "history", "project_id": project_id, **batch}
+                    if not batch["has_more"]:
+                        return
+                    since_id = ObjectId(batch["messages"][-1]["message_id"])
+
+        page = await self._latest(project_id, limit)
+        yield {
+            "type": "history",
+            "project_id": project_id,
+            "messages": page["items"],
+            "has_more": False,
+            "before": page["next_cursor"],
+            "reset": bool(since),
+        }
+
+    async def _warm(self, project_id: str):
+        """Seed the project's recent buffer from Mongo the first time it is asked for."""
+        if not self.recent.is_seeded(project_id):
+            page = await self.repo.get_before(project_id, None, self.recent.per_project)
+            self.recent.seed(project_id, page["items"], complete=page["next_cursor"] is None)
+
+    async def _latest(self, project_id: str, limit: int) -> dict:
+        cached = self.recent.latest(project_id, limit)
+        if cached is None:
+            return await self.repo.get_before(project_id, None, limit)
+        items, older_than = cached
+        return {"items": items, "next_cursor": encode_cursor(older_than) if older_than else None}
+
+    async def mark_read(self, project_id: str, user_id: str, message_id: str) -> bool:
+        """
+        Receipt for everything up to ``message_id``; True when the watermark
+        moved. The id must be a message of the project: watermarks only
+        rise, so one forged far-future id would pin unread at 0 for good.
+        """
+        try:
+            last_read = ObjectId(message_id)
+        except (InvalidId, TypeError):
+            raise ValueError("Invalid message_id")
+        if not self.watermarks.advances(project_id, user_id, last_read):
+            return False
+        if not self.recent.contains(project_id, last_read) and not await self.repo.message_exists(project_id, last_read):
+            raise ValueError("Unknown message_id")
+        return self.watermarks.mark(project_id, user_id, last_read)
+
+    async def _watermark(self, project_id: str, user_id: str) -> Optional[ObjectId]:
+        pending = self.watermarks.pending(project_id, user_id)
+        stored = await self.repo.get_watermark(project_id, user_id)
+        return max((mark for mark in (pending, stored) if mark is not None), default=None)
+
+    async def get_unread(self, project_id: str, user_id: str) -> dict:
+        """Other members' messages after the user's watermark (all of them if never read)."""
+        last_read = await self._watermark(project_id, user_id)
+        cap = config["chat_unread_cap"]
+        unread = await self.repo.count_unread(project_id, user_id, last_read, cap)
+        return {
+            "project_id": project_id,
+            "last_read_id": str(last_read) if last_read else None,
+            "unread": unread,
+            "capped": unread >= cap,
+        }
+
+    async def get_receipts(self, project_id: str) -> list:
+        """Every member's watermark in the project, unflushed receipts included."""
+        marks = await self.repo.get_watermarks(project_id)
+        for user_id, mark in self.watermarks.pending_for_project(project_id).items():
+            if user_id not in marks or marks[user_id] < mark:
+                marks[user_id] = mark
+        return [{"user_id": user_id, "last_read_id": str(mark)} for user_id, mark in marks.items()]
+
+    async def get_messages(self, project_id: str, cursor: str = None, limit: int = None) -> dict:
+        """A page of messages older than ``cursor`` (latest page without one), oldest first."""
+        if not cursor and self.recent.is_seeded(project_id):
+            return await self._latest(project_id, clamp_limit(limit))
+        return await self.repo.get_before(project_id, cursor, limit)
+
+
+def encode_frame(message: dict) -> str:
+    """JSON text frame, encoded the way ``WebSocket.send_json`` does."""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class Connection:
+    """
+    One registered socket with its own bounded send queue. A drain task
+    writes queued frames in order, so a slow client only ever holds up its
+    own queue; frames offered while the queue is full are dropped. Inbound
+    frames refresh ``last_seen`` and spend from a token bucket.
+    """
+
+    __slots__ = ("websocket", "user_id", "projects", "queue", "consecutive_drops", "closed", "_gone", "_task",
+                 "last_seen", "tokens", "refilled_at")
+
+    def __init__(self, websocket, user_id: str, max_queue: int, burst: float = 0):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.projects = set()
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.consecutive_drops = 0
+        self.closed = False
+        self._gone = asyncio.Event()  # wakes replies waiting for queue room once closed
+        self._task: Optional[asyncio.Task] = None
+        self.last_seen = self.refilled_at = time.monotonic()
+        self.tokens = burst
+
+    def take(self, rate: float, burst: float) -> bool:
+        """Record an inbound frame; False when it exceeds ``rate`` per second (bursts up to ``burst``)."""
+        now = time.monotonic()
+        self.last_seen = now
+        self.tokens = min(burst, self.tokens + (now - self.refilled_at) * rate)
+        self.refilled_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def start(self, on_sent):
+        """Start delivering; frames offered before this are kept in order."""
+        self._task = asyncio.create_task(self._drain(on_sent))
 
-    def get_chat_history(self, project_id):
-        return self.repo.get_history(project_id)
+    def offer(self, payload: str) -> bool:
+        try:
+            self.queue.put_nowait((payload, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.consecutive_drops += 1
+            return False
+        self.consecutive_drops = 0
+        return True
+
+    async def push(self, payload: str) -> bool:
+        """
+        Queue a frame this socket asked for (a reply), waiting for room
+        rather than dropping it; gives up (False) once the socket is closed,
+        since nothing drains the queue after that.
+        """
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait((payload, time.perf_counter()))
+            return True
+        except asyncio.QueueFull:
+            pass
+        put = asyncio.ensure_future(self.queue.put((payload, time.perf_counter())))
+        gone = asyncio.ensure_future(self._gone.wait())
+        try:
+            await asyncio.wait({put, gone}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            gone.cancel()
+            if not put.done():
+                put.cancel()
+        return put.done() and not put.cancelled()
+
+    def mark_closed(self):
+        self.closed = True
+        self._gone.set()
+
+    async def _drain(self, on_sent):
+        try:
+            while True:
+                payload, queued_at = await self.queue.get()
+                await self.websocket.send_text(payload)
+                on_sent(queued_at)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Client gone; the websocket route unregisters it
+            self.mark_closed()
+
+    async def close(self, code: int = None):
+        self.mark_closed()
+        if self._task is not None:
+            self._task.cancel()
+        if code is not None:
+            try:
+                await self.websocket.close(code=code)
+            except Exception:
+                pass
 
 
 class WebSocketManager:
-    def __init__(self):
-        self.connections = {}  # user_id: websocket
-        self.groups = {}       # project_id: set(user_ids)
+    """
+    Registry of this worker's sockets and project fan-out. A user may hold
+    several sockets and each socket may be subscribed to several projects;
+    presence ("is Y online", "is Y in project X", "how many are online in
+    X") is answered from dicts without scanning connections.
+
+    A broadcast is encoded once and published through the broker, which
+    hands it to every worker with members in the project; each worker
+    offers it to the subscribed sockets' send queues without awaiting any
+    of them. A socket that keeps dropping frames (``slow_consumer_drops``
+    in a row) is disconnected and can resume with ``?since=``.
+
+    ``run_reaper`` pings every socket each ``heartbeat_interval`` and
+    closes the ones that sent nothing (no pong either) for ``idle_timeout``
+    seconds, along with sockets whose client is already gone, so half-open
+    connections do not pile up between restarts.
+    """
+
+    def __init__(self, max_queue: int = None, slow_consumer_drops: int = None, broker: ChatBroker = None,
+                 recent: RecentMessages = None):
+        self.sockets = {}   # user_id: set(Connection)
+        self.groups = {}    # project_id: set(Connection)
+        self.presence = {}  # project_id: {user_id: that user's sockets in the project}
+        self.recent = recent or recent_messages
+        self.broker = broker or chat_broker()
+        self.broker.bind(self._deliver, on_remote=self.recent.append_frame)
+        self.max_queue = max_queue or config["ws_send_queue_size"]
+        self.slow_consumer_drops = slow_consumer_drops or config["ws_slow_consumer_drops"]
+        self.heartbeat_interval = config["ws_heartbeat_interval"]
+        self.idle_timeout = config["ws_idle_timeout"]
+        self.max_frame_bytes = config["ws_max_frame_bytes"]
+        self.rate = config["ws_rate_per_sec"]
+        self.burst = config["ws_rate_burst"]
+        self.max_sockets_per_user = config["ws_max_sockets_per_user"]
+        self._counters = {
+            "broadcasts": 0, "frames_queued": 0, "frames_sent": 0, "frames_dropped": 0, "slow_disconnects": 0,
+            "pings": 0, "reaped_idle": 0, "reaped_gone": 0, "rate_limited": 0, "oversized_frames": 0,
+            "rejected_sockets": 0,
+        }
+        self._fanout_ms = {"max": 0.0, "total": 0.0}
+        self._delivery_ms = {"max": 0.0, "total": 0.0}
+
+    async def connect(self, user_id, websocket) -> Optional[Connection]:
+        """Register the socket (None past ``max_sockets_per_user``); frames queue up until ``start_delivery``."""
+        user_sockets = self.sockets.setdefault(user_id, set())
+        if len(user_sockets) >= self.max_sockets_per_user:
+            self._counters["rejected_sockets"] += 1
+            return None
+        connection = Connection(websocket, user_id, self.max_queue, self.burst)
+        user_sockets.add(connection)
+        return connection
+
+    def inbound(self, connection: Connection, text: str) -> Optional[str]:
+        """Check a client frame: None if it may be handled, else "too_big" or "rate_limited"."""
+        if len(text) > self.max_frame_bytes or len(text.encode("utf-8")) > self.max_frame_bytes:
+            self._counters["oversized_frames"] += 1
+            return "too_big"
+        if not connection.take(self.rate, self.burst):
+            self._counters["rate_limited"] += 1
+            return "rate_limited"
+        return None
+
+    def start_delivery(self, connection: Connection):
+        connection.start(self._record_sent)
+
+    def subscribe(self, connection: Connection, project_id: str) -> bool:
+        if project_id in connection.projects:
+            return False
+        connection.projects.add(project_id)
+        if project_id not in self.groups:
+            self.groups[project_id] = set()
+            self.presence[project_id] = {}
+            self.broker.subscribe(project_id)
+        self.groups[project_id].add(connection)
+        members = self.presence[project_id]
+        members[connection.user_id] = members.get(connection.user_id, 0) + 1
+        return True
+
+    def unsubscribe(self, connection: Connection, project_id: str) -> bool:
+        if project_id not in connection.projects:
+            return False
+        connection.projects.discard(project_id)
+        group = self.groups[project_id]
+        group.discard(connection)
+        members = self.presence[project_id]
+        members[connection.user_id] -= 1
+        if not members[connection.user_id]:
+            del members[connection.user_id]
+        if not group:
+            del self.groups[project_id]
+            del self.presence[project_id]
+            self.broker.unsubscribe(project_id)
+            if self.broker.remote:
+                # Other workers' messages stop arriving here, so the buffer would go stale
+                self.recent.forget(project_id)
+        return True
 
-    async def connect(self, user_id, project_id, websocket):
-        self.connections[user_id] = websocket
-        self.groups.setdefault(project_id, set()).add(user_id)
+    async def disconnect(self, connection: Connection, code: int = None):
+        for project_id in list(connection.projects):
+            self.unsubscribe(connection, project_id)
+        user_sockets = self.sockets.get(connection.user_id)
+        if user_sockets is not None:
+            user_sockets.discard(connection)
+            if not user_sockets:
+                del self.sockets[connection.user_id]
+        await connection.close(code)
 
-    async def disconnect(self, user_id, project_id):
-        self.connections.pop(user_id, None)
-        if project_id in self.groups:
-            self.groups[project_id].discard(user_id)
+    def _all_connections(self) -> list:
+        return [connection for user_sockets in self.sockets.values() for connection in user_sockets]
+
+    async def reap(self):
+        """Close idle or dead sockets and ping the rest."""
+        now = time.monotonic()
+        ping = encode_frame({"type": "ping"})
+        for connection in self._all_connections():
+            if connection.closed:
+                self._counters["reaped_gone"] += 1
+                await self.disconnect(connection)
+            elif now - connection.last_seen > self.idle_timeout:
+                self._counters["reaped_idle"] += 1
+                await self.disconnect(connection, code=status.WS_1001_GOING_AWAY)
+            elif not connection.queue.full():
+                # The client answers {"type": "pong"}; any frame counts as a sign of life
+                connection.offer(ping)
+                self._counters["pings"] += 1
+
+    async def run_reaper(self):
+        """Background task: heartbeats and reaping every ``heartbeat_interval`` seconds."""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            await self.reap()
+
+    def is_online(self, user_id: str) -> bool:
+        return user_id in self.sockets
+
+    def is_present(self, project_id: str, user_id: str) -> bool:
+        return user_id in self.presence.get(project_id, ())
+
+    def online_count(self, project_id: str) -> int:
+        return len(self.presence.get(project_id, ()))
+
+    def online_users(self, project_id: str) -> list:
+        return list(self.presence.get(project_id, ()))
+
+    async def reply(self, connection: Connection, message: dict) -> bool:
+        """Frame for one socket, behind anything already queued for it; False once it is closed."""
+        return await connection.push(encode_frame(message))
 
     async def send_to_group(self, project_id, message: dict):
-        for uid in self.groups.get(project_id, []):
-            if uid in self.connections:
-                await self.connections[uid].send_json(message)
\ No newline at end of file
+        await self.broker.publish(project_id, encode_frame(message))
+
+    def _deliver(self, project_id: str, payload: str):
+        """Broker callback: offer an encoded frame to this worker's subscribed sockets."""
+        started = time.perf_counter()
+        for connection in list(self.groups.get(project_id, ())):
+            if not connection.closed:
+                self._offer(connection, payload)
+        elapsed = (time.perf_counter() - started) * 1000
+        self._counters["broadcasts"] += 1
+        self._fanout_ms["max"] = max(self._fanout_ms["max"], elapsed)
+        self._fanout_ms["total"] += elapsed
+
+    def _offer(self, connection: Connection, payload: str) -> bool:
+        if connection.offer(payload):
+            self._counters["frames_queued"] += 1
+            return True
+        self._counters["frames_dropped"] += 1
+        if connection.consecutive_drops >= self.slow_consumer_drops and not connection.closed:
+            self._counters["slow_disconnects"] += 1
+            connection.mark_closed()
+            asyncio.create_task(connection.close(code=status.WS_1013_TRY_AGAIN_LATER))
+        return False
+
+    def _record_sent(self, queued_at: float):
+        elapsed = (time.perf_counter() - queued_at) * 1000
+        self._counters["frames_sent"] += 1
+        self._delivery_ms["max"] = max(self._delivery_ms["max"], elapsed)
+        self._delivery_ms["total"] += elapsed
+
+    def stats(self) -> dict:
+        broadcasts, sent = self._counters["broadcasts"], self._counters["frames_sent"]
+        connections = self._all_connections()
+        # Registered but gone, or silent past two heartbeats: reaped on a coming pass
+        silent_after = time.monotonic() - 2 * self.heartbeat_interval
+        zombies = sum(1 for connection in connections if connection.closed or connection.last_seen < silent_after)
+        return {
+            **self._counters,
+            "users_online": len(self.sockets),
+            "connections": len(connections),
+            "live_connections": len(connections) - zombies,
+            "zombie_connections": zombies,
+            "projects": len(self.groups),
+            "queued_now": sum(connection.queue.qsize() for connection in connections),
+            "fanout_ms_avg": round(self._fanout_ms["total"] / broadcasts, 3) if broadcasts else 0.0,
+            "fanout_ms_max": round(self._fanout_ms["max"], 3),
+            "delivery_ms_avg": round(self._delivery_ms["total"] / sent, 3) if sent else 0.0,
+            "delivery_ms_max": round(self._delivery_ms["max"], 3),
+            "broker": self.broker.stats(),
+            "recent_messages": self.recent.stats(),
+        }
@@ -1,4 +1,4 @@
-from app.repositories.ticket import TicketRepository
+from app.repositories.ticket import TicketRepository, ticket_repository
 from app.models.ticket import (
     TicketCreate, TicketUpdate, TicketStatusUpdate, TicketOut, TimelineEntry,
     TimelineAction, TicketStatus, TicketAdminResponse
@@ -6,17 +6,32 @@ from app.models.ticket import (
 from fastapi import HTTPException
 import datetime
 
+# role -> target status -> statuses it may be reached from
+TICKET_TRANSITIONS = {
+    "FL": {
+        TicketStatus.REOPENED: {TicketStatus.CLOSED},
+    },
+    "SA": {
+        TicketStatus.IN_PROGRESS: {TicketStatus.OPEN, TicketStatus.REOPENED},
+        TicketStatus.RESOLVED: {TicketStatus.OPEN, TicketStatus.IN_PROGRESS, TicketStatus.REOPENED},
+        TicketStatus.CLOSED: {
+            TicketStatus.OPEN, TicketStatus.IN_PROGRESS, TicketStatus.RESOLVED, TicketStatus.REOPENED
+        },
+    },
+}
+
+
 class TicketService:
     def __init__(self, repo: TicketRepository = None):
-        self.repo = repo or TicketRepository()
+        self.repo = repo or ticket_repository()
 
-    def create_ticket(self, freelancer_id, client_id, subject, description, user):
-        timeline = [TimelineEntry(
+    async def create_ticket(self, freelancer_id, client_id, subject, description, user):
+        entry = TimelineEntry(
             action=TimelineAction.CREATED,
             user_id=user["user_id"],
             user_role=user["role"],
             comment="Ticket created"
-        ).model_dump()]
+        ).model_dump()
         data = {
             "freelancer_id": freelancer_id,
             "client_id": client_id,
@@ -24,77 +39,94 @@ class TicketService:
             "description": description,
             "status": TicketStatus.OPEN,
             "solution": None,
-            "timeline": timeline
         }
-        return self.repo.create_ticket(data)
+        return await self.repo.create_ticket(data, entry)
 
-    def update_ticket(self, ticket_id: str, update: TicketUpdate, user):
-        ticket = self.repo.get_ticket(ticket_id)
+    async def update_ticket(self, ticket_id: str, update: TicketUpdate, user):
+        ticket = await self.repo.get_ticket(ticket_id)
         if not ticket or ticket["freelancer_id"] != user["user_id"]:
             raise HTTPException(403, "Only the freelancer can update their ticket.")
         update_dict = update.model_dump(exclude_unset=True)
-        self.repo.update_ticket(ticket_id, update_dict)
-        self.repo.add_timeline_entry(ticket_id, TimelineEntry(
+        return await self.repo.update_ticket(ticket_id, update_dict, TimelineEntry(
             action=TimelineAction.UPDATED,
             user_id=user["user_id"],
             user_role=user["role"],
             comment="Ticket updated"
         ).model_dump())
-        return self.repo.get_ticket(ticket_id)
 
-    def update_ticket_status(self, ticket_id: str, status: TicketStatus, user):
-        ticket = self.repo.get_ticket(ticket_id)
-        if not ticket:
-            raise HTTPException(404, "Ticket not found")
-        # Logic: Freelancer can reopen, super admin can close/resolve/in progress
-        if user["role"] == "FL" and status == TicketStatus.REOPENED:
-            if ticket["status"] != TicketStatus.CLOSED:
-                raise HTTPException(400, "Can only reopen a closed ticket.")
-        elif user["role"] == "SA":
-            if status not in [TicketStatus.IN_PROGRESS, TicketStatus.RESOLVED, TicketStatus.CLOSED]:
-                raise HTTPException(400, "Invalid status for admin.")
-        else:
+    async def update_ticket_status(self, ticket_id: str, status: TicketStatus, user):
+        # Freelancer can reopen, super admin can close/resolve/in progress
+        if user["role"] == "SA" and status not in TICKET_TRANSITIONS["SA"]:
+            raise HTTPException(400, "Invalid status for admin.")
+        if status not in TICKET_TRANSITIONS.get(user["role"], {}):
             raise HTTPException(403, "Not authorized.")
-        self.repo.update_ticket(ticket_id, {"status": status})
-        self.repo.add_timeline_entry(ticket_id, TimelineEntry(
+        return await self._transition(ticket_id, status, {"status": status}, TimelineEntry(
             action=TimelineAction.STATUS_CHANGED,
             user_id=user["user_id"],
             user_role=user["role"],
             status=status,
             comment=f"Status changed to {status.value}"
-        ).model_dump())
-        return self.repo.get_ticket(ticket_id)
+        ).model_dump(), user)
 
-    def admin_respond(self, ticket_id: str, response: TicketAdminResponse, user):
-        ticket = self.repo.get_ticket(ticket_id)
-        if not ticket or user["role"] != "SA":
+    async def admin_respond(self, ticket_id: str, response: TicketAdminResponse, user):
+        if user["role"] != "SA":
             raise HTTPException(403, "Only super admin can respond.")
-        self.repo.update_ticket(ticket_id, {
+        return await self._transition(ticket_id, TicketStatus.CLOSED, {
             "solution": response.comment,
             "status": TicketStatus.CLOSED
-        })
-        self.repo.add_timeline_entry(ticket_id, TimelineEntry(
+        }, TimelineEntry(
             action=TimelineAction.ADMIN_COMMENT,
             user_id=user["user_id"],
             user_role=user["role"],
             comment=response.comment,
             status=TicketStatus.CLOSED
-        ).model_dump())
-        return self.repo.get_ticket(ticket_id)
+        ).model_dump(), user)
+
+    async def _transition(self, ticket_id: str, status: TicketStatus, update_data: dict, entry: dict, user):
+        """
+        Apply a state change as one conditional update filtered on the
+        allowed current states, so concurrent changes cannot both win.
+        """
+        allowed_from = TICKET_TRANSITIONS[user["role"]][status]
+        # Freelancers may only act on their own tickets
+        owner = user["user_id"] if user["role"] == "FL" else None
+        ticket = await self.repo.transition_ticket(
+            ticket_id, [state.value for state in allowed_from], update_data, entry, freelancer_id=owner
+        )
+        if ticket is not None:
+            return ticket
+
+        # Nothing matched: work out why (only on the failure path)
+        current = await self.repo.get_ticket(ticket_id)
+        if not current:
+            raise HTTPException(404, "Ticket not found")
+        if owner is not None and current["freelancer_id"] != owner:
+            raise HTTPException(403, "Not allowed.")
+        raise HTTPException(409, f"Ticket is {current['status']}; it cannot be moved to {status.value}.")
 
-    def get_ticket(self, ticket_id: str, user):
-        ticket = self.repo.get_ticket(ticket_id)
+    async def get_ticket(self, ticket_id: str, user, projection: dict = None):
+        # The ownership check needs freelancer_id even if the caller did not ask for it
+        wanted = projection is None or "freelancer_id" in projection
+        if projection is not None:
+            projection = {**projection, "freelancer_id": 1}
+        ticket = await self.repo.get_ticket(ticket_id, projection)
         if not ticket:
             raise HTTPException(404, "Ticket not found")
         # Freelancer can only see their ticket, SA can see all
         if user["role"] == "FL" and ticket["freelancer_id"] != user["user_id"]:
             raise HTTPException(403, "Not allowed.")
+        if not wanted:
+            ticket.pop("freelancer_id")
         return ticket
 
-    def list_tickets(self, user):
+    async def get_timeline(self, ticket_id: str, user, cursor: str = None, limit: int = None):
+        ticket = await self.get_ticket(ticket_id, user, {"_id": 0, "ticket_id": 1, "last_entry": 1})
+        return await self.repo.get_timeline(ticket_id, cursor, limit, ticket.get("last_entry"))
+
+    async def list_tickets(self, user, cursor: str = None, limit: int = None, projection: dict = None):
         if user["role"] == "SA":
-            return self.repo.get_all_tickets()
+            return await self.repo.get_all_tickets(cursor, limit, projection)
         elif user["role"] == "FL":
-            return self.repo.get_tickets_by_freelancer(user["user_id"])
+            return await self.repo.get_tickets_by_freelancer(user["user_id"], cursor, limit, projection)
         else:
             raise HTTPException(403, "Not allowed.")
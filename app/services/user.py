@@ -1,70 +1,275 @@
-from app.repositories.user import UserRepository
-from app.models.user import UserCreate, UserUpdate, LoginRequest, RefreshRequest
-from app.core.keycloak import create_user_in_keycloak, authenticate_with_keycloak, refresh_access_token
+import asyncio
+import inspect
+import os
+from datetime import datetime, timedelta
+from typing import List
+import httpx
+from pymongo.errors import PyMongoError
+from starlette.concurrency import run_in_threadpool
+from app.repositories.user import UserRepository, user_repository
+from app.models.user import UserCreate, UserUpdate, LoginRequest, RefreshRequest, RoleEnum
+from app.core.audit_log import define_logger
+from app.core import keycloak_async
+from app.core.revocation import revocation_list
 from app.core.config import config
 import uuid
 from fastapi import HTTPException
 
+def keycloak_user_payload(user: UserCreate) -> dict:
+    """Keycloak user representation for a new platform user."""
+    return {
+        "username": user.user_id,
+        "email": user.email,
+        "firstName": user.first_name,
+        "lastName": user.last_name,
+        "enabled": True,
+        "emailVerified": True, 
+        "credentials": [
+            {"type": "password", "value": user.passcode, "temporary": False}
+        ],
+        "attributes": {
+            "role": user.role,
+        }
+    }
+
+
 class UserService:
     def __init__(self, user_repo: UserRepository = None):
-        self.user_repo = user_repo or UserRepository()
+        self.user_repo = user_repo or user_repository()
 
-    def create_user(self, user: UserCreate) -> dict:
+    async def create_user(self, user: UserCreate) -> dict:
         user.user_id = str(uuid.uuid4())
-        # 1. Prepare Keycloak payload
-        keycloak_payload = {
-            "username": user.user_id,
-            "email": user.email,
-            "firstName": user.first_name,
-            "lastName": user.last_name,
-            "enabled": True,
-            "emailVerified": True, 
-            "credentials": [
-                {"type": "password", "value": user.passcode, "temporary": False}
-            ],
-            "attributes": {
-                "role": user.role,
-            }
-        }
-        # 2. Create in Keycloak
-        keycloak_id = create_user_in_keycloak(keycloak_payload)
+        # 1. Fast-fail on a taken email/username before touching Keycloak
+        conflict = await self.user_repo.find_conflict(user.email, user.username)
+        if conflict:
+            raise HTTPException(409, f"A user with this {conflict} already exists")
+
+        # 2. Reserve in Mongo; the unique indexes settle concurrent signups
+        await self.user_repo.reserve_user(user)
 
-        # 3. Attach keycloak_id to user for Mongo
-        user.keycloak_id = keycloak_id
+        # 3. Create in Keycloak, releasing the reservation if that fails
+        try:
+            keycloak_id = await keycloak_async.create_user_in_keycloak(keycloak_user_payload(user))
+        except Exception:
+            await self.user_repo.release_users([user.user_id])
+            raise
 
-        # 4. Save user to Mongo
-        data =self.user_repo.create_user(user)
+        # 4. Confirm, or undo the Keycloak side
+        try:
+            data = await self.user_repo.confirm_user(user.user_id, keycloak_id)
+        except PyMongoError:
+            data = None
+        if data is None:
+            await self._rollback_signup(user.user_id, keycloak_id)
+            raise HTTPException(500, "Failed to complete signup")
         return data
 
-    def get_user(self, user_id: str) -> dict:
-        return self.user_repo.get_user_by_id(user_id)
+    async def _rollback_signup(self, user_id: str, keycloak_id: str):
+        try:
+            await keycloak_async.delete_user_in_keycloak(None, keycloak_id)
+            await self.user_repo.release_users([user_id])
+        except Exception as exc:
+            # Left PENDING; the reconciler retries the cleanup
+            define_logger(
+                level=40,
+                message=f"Signup rollback for {user_id} failed: {exc}",
+                pid=os.getpid(),
+                loggName=inspect.stack()[0],
+            )
+
+    async def reconcile_pending_signups(self) -> int:
+        """
+        Clean up one batch of signups stuck in PENDING past the reservation
+        timeout: delete whatever Keycloak user was created for them, then
+        release the reservations. Returns how many were released.
+        """
+        batch_size = config["signup_reconcile_batch"]
+        cutoff = datetime.utcnow() - timedelta(seconds=config["signup_reservation_timeout"])
+        stale = await self.user_repo.get_stale_reservations(cutoff, batch_size)
+        released = []
+        for reservation in stale:
+            try:
+                for kc_user in await keycloak_async.find_users_in_keycloak(reservation["user_id"]):
+                    await keycloak_async.delete_user_in_keycloak(None, kc_user["id"])
+            except Exception as exc:
+                define_logger(
+                    level=30,
+                    message=f"Could not clean up pending signup {reservation['user_id']}: {exc}",
+                    pid=os.getpid(),
+                    loggName=inspect.stack()[0],
+                )
+                continue
+            released.append(reservation["user_id"])
+        await self.user_repo.release_users(released)
+        return len(released)
+
+    async def run_signup_reconciler(self):
+        """Background task draining stale reservations in batches."""
+        while True:
+            await asyncio.sleep(config["signup_reconcile_interval"])
+            try:
+                while await self.reconcile_pending_signups() >= config["signup_reconcile_batch"]:
+                    pass
+            except Exception as exc:
+                define_logger(
+                    level=40,
+                    message=f"Signup reconciliation failed: {exc}",
+                    pid=os.getpid(),
+                    loggName=inspect.stack()[0],
+                )
+
+    async def bulk_create_users(self, users: List[UserCreate]) -> dict:
+        """
+        Provision a batch of users: Keycloak through partial import in chunks,
+        Mongo with one insert_many per chunk. Every record gets its own
+        result; Keycloak users whose Mongo insert fails are deleted again.
+        """
+        results = [
+            {"index": index, "email": user.email, "user_id": None, "status": "failed", "error": None}
+            for index, user in enumerate(users)
+        ]
+        seen_emails = set()
+        pending = []
+        for index, user in enumerate(users):
+            if user.role == RoleEnum.SUPER_ADMIN:
+                results[index]["error"] = "Cannot create super admin users."
+                continue
+            email = user.email.lower()
+            if email in seen_emails:
+                results[index]["error"] = "Duplicate email in batch."
+                continue
+            seen_emails.add(email)
+            user.user_id = str(uuid.uuid4())
+            results[index]["user_id"] = user.user_id
+            pending.append(index)
+
+        chunk_size = config["bulk_import_chunk_size"]
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            await self._provision_chunk([users[i] for i in chunk], [results[i] for i in chunk])
+
+        created = sum(1 for result in results if result["status"] == "created")
+        return {"total": len(users), "created": created, "failed": len(users) - created, "results": results}
+
+    async def _provision_chunk(self, users: List[UserCreate], results: List[dict]):
+        by_username = {user.user_id: (user, result) for user, result in zip(users, results)}
+        try:
+            report = await keycloak_async.partial_import_users(
+                [keycloak_user_payload(user) for user in users],
+                timeout=config["bulk_import_timeout"],
+            )
+        except HTTPException as exc:
+            for result in results:
+                result["error"] = str(exc.detail)
+            return
+        except httpx.HTTPError as exc:
+            # Keycloak may have imported part of the chunk before the call failed
+            await self._reconcile_failed_import(users, results, exc)
+            return
+
+        imported = []
+        for entry in report.get("results", []):
+            if entry.get("resourceType", "USER") != "USER" or entry.get("resourceName") not in by_username:
+                continue
+            user, result = by_username[entry["resourceName"]]
+            if entry.get("action") == "ADDED" and entry.get("id"):
+                user.keycloak_id = entry["id"]
+                imported.append((user, result))
+            else:
+                result["error"] = f"Keycloak {str(entry.get('action', 'rejected')).lower()} the user (username or email exists)"
+        for user, result in by_username.values():
+            if result["error"] is None and not user.keycloak_id:
+                result["error"] = "User missing from Keycloak import report"
+
+        try:
+            failed = await self.user_repo.create_users([user for user, _ in imported])
+        except PyMongoError as exc:
+            failed = {index: str(exc) for index in range(len(imported))}
+
+        for index, (user, result) in enumerate(imported):
+            if index not in failed:
+                result["status"] = "created"
+                continue
+            result["error"] = f"Database insert failed: {failed[index]}"
+            # Compensate so Keycloak does not keep a user Mongo never saw
+            try:
+                await keycloak_async.delete_user_in_keycloak(None, user.keycloak_id)
+            except Exception as exc:
+                result["error"] += f"; rollback of Keycloak user {user.keycloak_id} failed: {exc}"
+                define_logger(
+                    level=40,
+                    message=f"Orphaned Keycloak user {user.keycloak_id} after bulk provisioning",
+                    pid=os.getpid(),
+                    loggName=inspect.stack()[0],
+                )
+
+    async def _reconcile_failed_import(self, users: List[UserCreate], results: List[dict], exc: Exception):
+        """Fail the chunk and delete whatever Keycloak did import of it, as Mongo has none of it."""
+        for user, result in zip(users, results):
+            result["error"] = f"Keycloak import failed: {exc!r}"
+            try:
+                found = await keycloak_async.find_users_in_keycloak(user.user_id)
+                for keycloak_user in found:
+                    await keycloak_async.delete_user_in_keycloak(None, keycloak_user["id"])
+            except Exception as cleanup_exc:
+                result["error"] += f"; cleanup of Keycloak user {user.user_id} failed: {cleanup_exc!r}"
+                define_logger(
+                    level=40,
+                    message=f"Possible orphaned Keycloak user {user.user_id} after failed bulk import",
+                    pid=os.getpid(),
+                    loggName=inspect.stack()[0],
+                )
+
+    async def get_user(self, user_id: str) -> dict:
+        return await self.user_repo.get_user_by_id(user_id)
     
-    def list_freelancer(self) -> dict:
-        return self.user_repo.get_freelancers()
+    async def list_freelancer(self, cursor: str = None, limit: int = None, projection: dict = None) -> dict:
+        return await self.user_repo.get_freelancers(cursor, limit, projection)
 
-    def update_user(self, user_id: str, user: UserUpdate) -> dict:
-        return self.user_repo.update_user(user_id, user)
+    async def update_user(self, user_id: str, user: UserUpdate) -> dict:
+        return await self.user_repo.update_user(user_id, user)
 
-    def delete_user(self, user_id: str):
-        return self.user_repo.delete_user(user_id)
+    async def delete_user(self, user_id: str):
+        try:
+            user = await self.user_repo.get_user_by_id(user_id)
+        except HTTPException:
+            # Already banned/deleted users have had their tokens revoked.
+            user = None
+        result = await self.user_repo.delete_user(user_id)
+        if user:
+            await run_in_threadpool(revocation_list.revoke_user, user.get("keycloak_id"))
+        return result
     
-    def user_login(self, data: LoginRequest) -> dict:
-        data = authenticate_with_keycloak(username=data.username, passcode=data.password)
+    async def user_login(self, data: LoginRequest) -> dict:
+        data = await keycloak_async.authenticate_with_keycloak(username=data.username, passcode=data.password)
         return data
     
-    def user_refresh(self, data: RefreshRequest) -> dict:
-        data = refresh_access_token(refresh_token=data.refresh_token)
+    async def user_refresh(self, data: RefreshRequest) -> dict:
+        data = await keycloak_async.refresh_access_token(refresh_token=data.refresh_token)
         return data
+
+    async def user_logout(self, user: dict):
+        sid = user.get("sid")
+        if sid:
+            await keycloak_async.logout_user_session(sid)
+            return
+        # Tokens without a session id (e.g. client credentials) can only be
+        # revoked wholesale for the user.
+        if not user.get("keycloak_id"):
+            raise HTTPException(400, "Token carries no session to log out.")
+        await keycloak_async.logout_all_user_sessions(None, user["keycloak_id"])
     
-    def ban_user(self, user_id: str):
-        user = self.user_repo.get_user_by_id(user_id)
+    async def ban_user(self, user_id: str):
+        user = await self.user_repo.get_user_by_id(user_id)
         if not user:
             raise HTTPException(404, "User not found.")
         if user.get("status") == "BANNED":
             raise HTTPException(400, "User already banned.")
-        return self.user_repo.ban_user(user_id)
+        result = await self.user_repo.ban_user(user_id)
+        await run_in_threadpool(revocation_list.revoke_user, user.get("keycloak_id"))
+        return result
     
-    def create_root_user(self) -> dict:
+    async def create_root_user(self) -> dict:
         # Use values from config, not os.environ!
         root_email = config.user_name  # This is your superadmin email
         root_pass = config.passcode
@@ -72,9 +277,7 @@ class UserService:
         root_name = "Super Admin"
 
         # Check if root user exists (by email or role)
-        existing = self.user_repo.collection.find_one({
-            "$or": [{"email": root_email}, {"role": root_role}]
-        })
+        existing = await self.user_repo.find_root_user(root_email, root_role)
         if existing:
             return {"detail": "Root user already exists."}
         
@@ -96,7 +299,7 @@ class UserService:
             }
         }
         # Create in Keycloak
-        keycloak_id = create_user_in_keycloak(keycloak_payload)
+        keycloak_id = await keycloak_async.create_user_in_keycloak(keycloak_payload)
 
         # Build Mongo user object
         user = UserCreate(
@@ -114,5 +317,5 @@ class UserService:
             registration_type="admin"
         )
 
-        created = self.user_repo.create_user(user)
+        created = await self.user_repo.create_user(user)
         return created
@@ -0,0 +1,160 @@
+"""
+Count the MongoDB commands (and time) spent per API write path.
+
+Runs each write path the old way (write, then read the document back) and
+through the current repositories (one round-trip returning the post-image),
+and prints commands and latency per call. Needs a reachable MongoDB and the
+usual environment; point DB_NAME at a scratch database:
+
+    DB_NAME=giggle_bench python scripts/benchmark_write_paths.py [iterations]
+"""
+import os
+import sys
+import time
+import uuid
+from collections import Counter
+
+from pymongo import monitoring
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = Counter()
+
+    def started(self, event):
+        self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+counter = CommandCounter()
+# Must be registered before app.core.db creates the client.
+monitoring.register(counter)
+
+from app.models.user import UserCreate  # noqa: E402
+from app.repositories.request import RequestRepository  # noqa: E402
+from app.repositories.ticket import TicketRepository  # noqa: E402
+from app.repositories.user import UserRepository, user_cache  # noqa: E402
+
+tickets = TicketRepository()
+requests_ = RequestRepository()
+users = UserRepository()
+
+
+def new_user() -> UserCreate:
+    user_id = str(uuid.uuid4())
+    return UserCreate(
+        user_id=user_id,
+        username=user_id,
+        email=f"{user_id}@bench.invalid",
+        phone_number="0000000000",
+        role="FL",
+        first_name="Bench",
+        last_name="User",
+        passcode="unused",
+    )
+
+
+def new_ticket() -> dict:
+    return {"freelancer_id": "bench", "client_id": "bench", "subject": "s", "description": "d",
+            "status": "OPEN", "solution": None}
+
+
+ENTRY = {"action": "updated", "user_id": "bench", "user_role": "FL"}
+
+
+# --- previous implementations, kept here only for comparison ---
+
+def legacy_create_ticket():
+    data = {**new_ticket(), "timeline": [ENTRY]}
+    data["ticket_id"] = str(uuid.uuid4())
+    tickets.collection.insert_one(data)
+    return tickets.collection.find_one({"ticket_id": data["ticket_id"]}, {"_id": 0})
+
+
+def legacy_update_ticket(ticket_id):
+    # TicketService.update_ticket: read, $set, $push, read back
+    tickets.collection.find_one({"ticket_id": ticket_id}, {"_id": 0})
+    tickets.collection.update_one({"ticket_id": ticket_id}, {"$set": {"subject": "x"}})
+    tickets.collection.find_one({"ticket_id": ticket_id}, {"_id": 0})
+    tickets.collection.update_one({"ticket_id": ticket_id}, {"$push": {"timeline": ENTRY}})
+    return tickets.collection.find_one({"ticket_id": ticket_id}, {"_id": 0})
+
+
+def legacy_update_status(request_id):
+    requests_.collection.update_one({"request_id": request_id}, {"$set": {"status": "PENDING"}})
+    return requests_.collection.find_one({"request_id": request_id}, {"_id": 0})
+
+
+def legacy_create_user():
+    user_dict = new_user().model_dump()
+    user_dict.pop("passcode")
+    result = users.collection.insert_one(user_dict)
+    return users.collection.find_one({"_id": result.inserted_id}, {"_id": 0})
+
+
+def legacy_update_user(user_id):
+    users.collection.update_one({"user_id": user_id}, {"$set": {"first_name": "x"}})
+    user_cache.invalidate(user_id)
+    return users.get_user_by_id(user_id)
+
+
+# --- current implementations ---
+
+def current_update_ticket(ticket_id):
+    tickets.get_ticket(ticket_id)
+    return tickets.update_ticket(ticket_id, {"subject": "x"}, dict(ENTRY))
+
+
+def current_update_user(user_id):
+    user_cache.invalidate(user_id)
+    return users.update_user(user_id, {"first_name": "x"})
+
+
+def measure(fn, iterations):
+    counter.commands.clear()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - started
+    return sum(counter.commands.values()) / iterations, elapsed / iterations * 1000
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    ticket_id = tickets.create_ticket(new_ticket(), ENTRY)["ticket_id"]
+    request_id = requests_.create_request(f"bench-{uuid.uuid4()}", "bench")["request_id"]
+    user_id = users.create_user(new_user())["user_id"]
+
+    cases = [
+        ("create ticket", legacy_create_ticket, lambda: tickets.create_ticket(new_ticket(), ENTRY)),
+        ("update ticket", lambda: legacy_update_ticket(ticket_id), lambda: current_update_ticket(ticket_id)),
+        ("update request status", lambda: legacy_update_status(request_id),
+         lambda: requests_.update_status(request_id, "PENDING", "bench")),
+        ("create user", legacy_create_user, lambda: users.create_user(new_user())),
+        ("update user", lambda: legacy_update_user(user_id), lambda: current_update_user(user_id)),
+    ]
+
+    print(f"{'path':<24}{'cmds before':>12}{'cmds after':>12}{'ms before':>11}{'ms after':>10}")
+    try:
+        for label, before, after in cases:
+            before_cmds, before_ms = measure(before, iterations)
+            after_cmds, after_ms = measure(after, iterations)
+            print(f"{label:<24}{before_cmds:>12.1f}{after_cmds:>12.1f}{before_ms:>11.2f}{after_ms:>10.2f}")
+    finally:
+        bench_tickets = tickets.collection.distinct("ticket_id", {"freelancer_id": "bench"})
+        tickets.timelines.delete_many({"ticket_id": {"$in": bench_tickets}})
+        tickets.collection.delete_many({"freelancer_id": "bench"})
+        requests_.collection.delete_many({"freelancer_id": "bench"})
+        users.collection.delete_many({"email": {"$regex": r"@bench\.invalid$"}})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Cross-worker check for the Mongo chat broker.
+
+Starts several MongoCappedBroker instances in one process, each standing in
+for a worker with its own subscriptions, publishes frames from every
+"worker" to random projects and verifies that each frame reaches exactly
+the workers subscribed to its project, once, and nobody else. Needs a
+reachable MongoDB; point DB_NAME at a scratch database:
+
+    DB_NAME=giggle_bench python scripts/check_chat_broker.py [workers] [frames]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.broker import MongoCappedBroker  # noqa: E402
+from app.core.db import async_database  # noqa: E402
+
+COLLECTION = "chat_fanout_check"
+PROJECTS = [f"check-project-{n}" for n in range(6)]
+
+
+async def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+    received = [Counter() for _ in range(workers)]
+    brokers = []
+    for n in range(workers):
+        broker = MongoCappedBroker(async_database, COLLECTION, size_bytes=4 * 1024 * 1024, max_await_ms=100)
+        broker.bind(lambda project_id, payload, n=n: received[n].update([payload]))
+        for project_id in random.sample(PROJECTS, 3):
+            broker.subscribe(project_id)
+        await broker.start()
+        brokers.append(broker)
+    await asyncio.sleep(0.5)
+
+    expected = [Counter() for _ in range(workers)]
+    started = time.perf_counter()
+    for i in range(frames):
+        project_id = random.choice(PROJECTS)
+        await random.choice(brokers).publish(project_id, f"{project_id}:{i}")
+        for n, broker in enumerate(brokers):
+            if project_id in broker.projects:
+                expected[n][f"{project_id}:{i}"] += 1
+        if i == frames // 2:
+            # Reopens worker 0's cursor mid-stream; it must not lose or repeat frames
+            brokers[0].subscribe("check-project-idle")
+        await asyncio.sleep(0.002)
+    await asyncio.sleep(2)
+    elapsed = time.perf_counter() - started
+
+    ok = True
+    for n, broker in enumerate(brokers):
+        missing = expected[n] - received[n]
+        extra = received[n] - expected[n]
+        print(f"worker {n}: expected {sum(expected[n].values())} got {sum(received[n].values())} "
+              f"missing {sum(missing.values())} extra {sum(extra.values())} {broker.stats()}")
+        ok = ok and not missing and not extra
+        await broker.close()
+    await async_database.drop_collection(COLLECTION)
+    print(f"{frames} frames in {elapsed:.1f}s: {'OK' if ok else 'FAILED'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+Concurrency check for the ticket state machine.
+
+Many threads race CLOSED/REOPENED/IN_PROGRESS transitions on one ticket
+through TicketService. Every change must be atomic: each accepted change
+must leave exactly one timeline entry, the entries must form a valid chain
+of transitions, and every rejected change must get a 409. Needs a reachable
+MongoDB; point DB_NAME at a scratch database:
+
+    DB_NAME=giggle_bench python scripts/hammer_ticket_transitions.py [threads] [attempts]
+"""
+import asyncio
+import os
+import random
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException  # noqa: E402
+
+from app.core.db import ThreadpoolRepository  # noqa: E402
+from app.models.ticket import TicketAdminResponse, TicketStatus  # noqa: E402
+from app.repositories.ticket import TicketRepository  # noqa: E402
+from app.services.ticket import TICKET_TRANSITIONS, TicketService  # noqa: E402
+
+FREELANCER = {"user_id": "hammer-fl", "role": "FL"}
+ADMINS = [{"user_id": f"hammer-sa-{n}", "role": "SA"} for n in range(3)]
+
+
+async def attempt(service: TicketService, ticket_id: str) -> str:
+    choice = random.random()
+    try:
+        if choice < 0.4:
+            await service.update_ticket_status(ticket_id, TicketStatus.REOPENED, FREELANCER)
+        elif choice < 0.7:
+            await service.admin_respond(ticket_id, TicketAdminResponse(comment="done"), random.choice(ADMINS))
+        else:
+            await service.update_ticket_status(ticket_id, TicketStatus.IN_PROGRESS, random.choice(ADMINS))
+        return "applied"
+    except HTTPException as exc:
+        return str(exc.status_code)
+
+
+def worker(ticket_id: str, attempts: int) -> Counter:
+    service = TicketService(ThreadpoolRepository(TicketRepository()))
+
+    async def run():
+        outcomes = Counter()
+        for _ in range(attempts):
+            outcomes[await attempt(service, ticket_id)] += 1
+        return outcomes
+
+    return asyncio.run(run())
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    attempts = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    repo = TicketRepository()
+    ticket = asyncio.run(TicketService(ThreadpoolRepository(repo)).create_ticket(
+        freelancer_id=FREELANCER["user_id"], client_id="hammer-cl",
+        subject="hammer", description="hammer", user=FREELANCER,
+    ))
+    ticket_id = ticket["ticket_id"]
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(lambda _: worker(ticket_id, attempts), range(threads)))
+        outcomes = sum(results, Counter())
+
+        final = repo.get_ticket(ticket_id)
+        timeline, cursor = [], None
+        while True:
+            page = repo.get_timeline(ticket_id, cursor)
+            timeline.extend(page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert [entry["number"] for entry in timeline] == list(range(1, final["timeline_count"] + 1))
+        changes = timeline[1:]  # first entry is "created"
+        assert len(changes) == outcomes["applied"], (len(changes), outcomes)
+        assert set(outcomes) <= {"applied", "409"}, outcomes
+
+        allowed = {}
+        for targets in TICKET_TRANSITIONS.values():
+            for target, sources in targets.items():
+                allowed.setdefault(target.value, set()).update(state.value for state in sources)
+        previous = TicketStatus.OPEN.value
+        for entry in changes:
+            assert previous in allowed[entry["status"]], f"illegal {previous} -> {entry['status']}"
+            previous = entry["status"]
+        assert final["status"] == previous, (final["status"], previous)
+
+        print(f"{threads} threads x {attempts} attempts: {dict(outcomes)}; timeline consistent")
+    finally:
+        repo.collection.delete_one({"ticket_id": ticket_id})
+        repo.timelines.delete_many({"ticket_id": ticket_id})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Move embedded ticket timelines into the bucketed ticket_timelines collection.
+
+Safe to run while the new code serves traffic and safe to interrupt: a
+ticket counts as migrated once its embedded ``timeline`` array is gone, so
+a re-run picks up where the previous one stopped, and rewriting a bucket
+is idempotent. Entries the new code appended meanwhile (numbered after the
+embedded ones) are kept.
+
+    python scripts/migrate_ticket_timelines.py [--batch-size 100] [--max-tickets N]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.db import database  # noqa: E402
+from app.repositories.ticket import timeline_bucket  # noqa: E402
+
+
+def migrate_ticket(tickets, timelines, ticket: dict):
+    old = [{**entry, "number": number} for number, entry in enumerate(ticket.get("timeline") or [], start=1)]
+    migrated = len(old)
+    buckets = {}
+    for entry in old:
+        buckets.setdefault(timeline_bucket(entry["number"]), []).append(entry)
+
+    for seq, entries in buckets.items():
+        timelines.update_one(
+            {"ticket_id": ticket["ticket_id"], "seq": seq},
+            [{"$set": {
+                "ticket_id": ticket["ticket_id"],
+                "seq": seq,
+                # Replace the migrated range, keep entries written by the new code
+                "entries": {"$concatArrays": [
+                    {"$literal": entries},
+                    {"$filter": {
+                        "input": {"$ifNull": ["$entries", []]},
+                        "as": "entry",
+                        "cond": {"$gt": ["$$entry.number", migrated]},
+                    }},
+                ]},
+            }}],
+            upsert=True,
+        )
+
+    tickets.update_one(
+        {"_id": ticket["_id"], "timeline": {"$exists": True}},
+        [
+            {"$set": {
+                "timeline_count": {"$ifNull": ["$timeline_count", migrated]},
+                "last_entry": {"$ifNull": ["$last_entry", {"$literal": old[-1] if old else None}]},
+            }},
+            {"$unset": "timeline"},
+        ],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--max-tickets", type=int, default=None)
+    args = parser.parse_args()
+
+    tickets = database["tickets"]
+    timelines = database["ticket_timelines"]
+    remaining = tickets.count_documents({"timeline": {"$exists": True}})
+    print(f"{remaining} tickets to migrate")
+
+    done = 0
+    last_id = None
+    while args.max_tickets is None or done < args.max_tickets:
+        query = {"timeline": {"$exists": True}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(
+            tickets.find(query, {"_id": 1, "ticket_id": 1, "timeline": 1}).sort("_id", 1).limit(args.batch_size)
+        )
+        if not batch:
+            break
+        for ticket in batch:
+            migrate_ticket(tickets, timelines, ticket)
+            done += 1
+            last_id = ticket["_id"]
+            if args.max_tickets is not None and done >= args.max_tickets:
+                break
+        print(f"migrated {done}/{remaining}")
+
+    print(f"done: {done} tickets migrated")
+
+
+if __name__ == "__main__":
+    main()